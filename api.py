@@ -1,15 +1,19 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
 from fastapi import Depends, FastAPI, APIRouter
+from fastapi.responses import PlainTextResponse
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware
 
-from discord_bot_libs.utils import log_request_time_async
+from discord_bot_libs.constants import ApiConfig
+from discord_bot_libs.metrics import metrics
+from discord_bot_libs.stall_watchdog import stall_watchdog
+from discord_bot_libs.utils import RequestTimingMiddleware
 
 
 app = FastAPI()
 
 
-app.add_middleware(BaseHTTPMiddleware, dispatch=log_request_time_async)
+app.add_middleware(RequestTimingMiddleware)
 
 # root_router = APIRouter(dependencies=[Depends(verify_access_token)])
 root_router = APIRouter()
@@ -28,18 +32,39 @@ def root():
 def root():
     return {"message": "Pong!"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/stalls")
+async def event_loop_stalls():
+    return stall_watchdog.report()
+
 
 def run():
+    """Serve the API on its own, without the bot"""
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    uvicorn.run(app, host=ApiConfig.HOST, port=ApiConfig.PORT)
 
 
-def keep_alive():
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        logger.info("Starting FastAPI server in thread pool")
-        future = executor.submit(run)
-        try:
-            future.result()
-        except Exception as e:
-            logger.error(f"Error in FastAPI server: {e}")
+async def _serve_until_exit(server):
+    # uvicorn calls sys.exit when it can not start, which would stop the bot's event loop
+    try:
+        await server.serve()
+    except SystemExit as e:
+        raise RuntimeError(f"API server failed to start on {ApiConfig.HOST}:{ApiConfig.PORT} (exit code {e.code})") from None
 
+
+async def serve():
+    """Serve the API on the running event loop, next to the Discord client"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host=ApiConfig.HOST, port=ApiConfig.PORT, log_config=None))
+    logger.info(f"Serving API on {ApiConfig.HOST}:{ApiConfig.PORT}")
+    serving = asyncio.ensure_future(_serve_until_exit(server))
+    try:
+        await asyncio.shield(serving)
+    except asyncio.CancelledError:
+        # Let uvicorn finish open requests and run the lifespan shutdown
+        server.should_exit = True
+        await serving
+        raise
@@ -0,0 +1,90 @@
+"""Memory held by 10k history entries before and after the compact RequestInfo
+
+Usage:
+    python -m benchmarks.bench_history_memory [--entries 10000]
+
+"before" rebuilds the old layout, a pydantic RequestInfo pinning the requester object
+and a validated MusicInfo with stream URL and description. "after" is what
+MusicState.add_to_history keeps today. Prints one JSON document.
+"""
+import argparse
+import json
+import tracemalloc
+from datetime import datetime
+
+from loguru import logger
+from pydantic import BaseModel, ConfigDict
+
+from benchmarks.sample_data import map_validated
+from discord_bot_api.model.music_model import MusicState, map_music_info, map_request_info
+from tests.fakes import raw_info
+
+
+class LegacyRequestInfo(BaseModel):
+    music_info: object
+    requester: object
+    time: datetime
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+class FakeAvatar:
+    url = 'https://cdn.discordapp.com/avatars/546919469470056448/0123456789abcdef0123456789abcdef.png?size=1024'
+
+
+class FakeMember:
+    """Stand-in for the discord.Member every legacy entry pinned, shared per user like the member cache"""
+    def __init__(self, member_id: int):
+        self.id = member_id
+        self.display_name = f'member-{member_id}'
+        self.display_avatar = FakeAvatar()
+
+
+def measure(build) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return size
+
+
+def build_legacy(entries: int, members: list):
+    history = []
+    for index in range(entries):
+        music_info = map_validated(raw_info(index))
+        history.append(LegacyRequestInfo.model_construct(music_info=music_info, requester=members[index % len(members)], time=datetime.now()))
+    return history
+
+
+def build_compact(entries: int, members: list):
+    music_state = MusicState(max_history_length=entries)
+    for index in range(entries):
+        music_info = map_music_info(raw_info(index))
+        music_state.add_to_history(map_request_info(music_info, members[index % len(members)]))
+    return music_state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10_000)
+    args = parser.parse_args()
+
+    members = [FakeMember(index) for index in range(20)]
+    logger.remove()
+    before = measure(lambda: build_legacy(args.entries, members))
+    after = measure(lambda: build_compact(args.entries, members))
+    print(json.dumps({
+        'entries': args.entries,
+        'before_bytes': before,
+        'after_bytes': after,
+        'before_bytes_per_entry': before / args.entries,
+        'after_bytes_per_entry': after / args.entries,
+        'reduction': 1 - after / before,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
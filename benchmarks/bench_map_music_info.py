@@ -0,0 +1,62 @@
+"""Time and memory of mapping yt-dlp info dicts to MusicInfo
+
+Usage:
+    python -m benchmarks.bench_map_music_info [--count 10000] [--repeat 5]
+
+"validated" is the previous map_music_info, a validated MusicInfo that copies the
+description. "fast" is the current map_music_info. Prints one JSON document.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.sample_data import map_validated
+from discord_bot_api.model.music_model import map_music_info
+from tests.fakes import raw_info
+
+
+def run(mapper, infos: list, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for info in infos:
+            mapper(info)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+
+    # The info dicts are built and dropped while tracing, so only what the mapped
+    # objects keep alive (the description included) is counted
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [mapper(raw_info(index)) for index in range(len(infos))]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return {
+        'best_seconds': best,
+        'microseconds_per_info': best / len(infos) * 1e6,
+        'retained_bytes_per_info': size / len(infos),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    infos = [raw_info(index) for index in range(args.count)]
+    validated = run(map_validated, infos, args.repeat)
+    fast = run(map_music_info, infos, args.repeat)
+    print(json.dumps({
+        'count': args.count,
+        'validated': validated,
+        'fast': fast,
+        'speedup': validated['best_seconds'] / fast['best_seconds'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""End-to-end latency of the music commands against local stand-ins
+
+Usage:
+    python -m benchmarks.bench_music_commands [--scenario all] [--guilds 8] [--users 8]
+        [--extract-latency 0.3] [--http-latency 0.05] [--connect-latency 0.2] [--track-seconds 2]
+        [--ffmpeg-latency 0.15] [--gapless]
+
+Drives music_manager.play/skip/seek/previous/queue with fake interactions, followup webhooks,
+voice clients that read frames in real time and an extractor with the given latency (see
+tests/fakes.py). Journaling, the audio cache, loudness analysis and the music info
+cache are off so every run starts cold. Prints one JSON document with p50/p95/p99 per
+command, the time from the first /play of a guild to its first audio frame and the
+silence between tracks. --gapless chains tracks inside one voice player, the in-player
+hand-overs only show up in track_gap.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from loguru import logger
+
+from discord_bot_libs.audio_cache import audio_cache
+from discord_bot_libs.constants import GaplessConfig, JournalConfig
+from discord_bot_libs.loudness import loudness_index
+from discord_bot_libs.manager import music_manager
+from discord_bot_libs.resolver import resolver
+from tests.fakes import FakeExtractor, FakeInteraction, FakeMember, FakeTextChannel, FakeVoiceChannel, fake_audio_source
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000 if samples else None
+
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': samples[-1] * 1000 if samples else None,
+    }
+
+
+class Harness:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.latencies: dict[str, list] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.first_play_at: dict[int, float] = {}
+        self.guild_voice: dict[int, object] = {}
+        self.voice_channels: dict[int, FakeVoiceChannel] = {}
+        self.text_channels: dict[int, FakeTextChannel] = {}
+        self.sources: list = []
+
+    async def audio_source(self, music_info, *args, **kwargs):
+        """Stands in for music_manager.create_audio_source"""
+        source = await fake_audio_source(self.args.track_seconds, music_info, startup=self.args.ffmpeg_latency, **kwargs)
+        self.sources.append(source)
+        return source
+
+    def interaction(self, guild_id: int, user_id: int) -> FakeInteraction:
+        if guild_id not in self.voice_channels:
+            self.voice_channels[guild_id] = FakeVoiceChannel(guild_id, self.args.connect_latency, self.guild_voice)
+            self.text_channels[guild_id] = FakeTextChannel(guild_id)
+        user = FakeMember(user_id, self.voice_channels[guild_id])
+        return FakeInteraction(user, guild_id, self.text_channels[guild_id], self.args.http_latency)
+
+    async def command(self, name: str, guild_id: int, user_id: int, *args):
+        interaction = self.interaction(guild_id, user_id)
+        await interaction.response.defer()
+        if name == 'play':
+            self.first_play_at.setdefault(guild_id, time.perf_counter())
+        start_time = time.perf_counter()
+        try:
+            await getattr(music_manager, name)(interaction, *args)
+            self.latencies[name].append(time.perf_counter() - start_time)
+        except Exception as e:
+            self.errors[f'{name}: {type(e).__name__}: {e}'] += 1
+
+    async def wait_for_tracks(self, count: int = 1):
+        await asyncio.sleep(count * self.args.track_seconds + 1.0)
+
+    def report(self) -> dict:
+        first_audio, transitions, skips = [], [], []
+        for guild_id, voice_client in self.guild_voice.items():
+            if voice_client.first_frame_at and guild_id in self.first_play_at:
+                first_audio.append(voice_client.first_frame_at[0] - self.first_play_at[guild_id])
+            transitions.extend(voice_client.transition_gaps)
+            skips.extend(voice_client.skip_gaps)
+        return {
+            'commands': {name: summarize(samples) for name, samples in sorted(self.latencies.items())},
+            'time_to_first_audio': summarize(first_audio),
+            'transition_gap': summarize(transitions),
+            'skip_gap': summarize(skips),
+            'track_gap': summarize([source.gap for source in self.sources if source.gap is not None]),
+            'errors': dict(self.errors),
+        }
+
+    async def close(self):
+        voice_clients = list(self.guild_voice.values())
+        for guild_id in list(self.guild_voice):
+            await music_manager.registry.evict(guild_id)
+        # Let the frame threads exit and their after= callbacks run while the loop is alive
+        for voice_client in voice_clients:
+            await asyncio.to_thread(voice_client.join)
+        await asyncio.sleep(0.1)
+
+
+async def single_guild(harness: Harness):
+    """One user plays a few tracks, looks at the queue, lets one track end, skips, seeks and goes back"""
+    for index in range(3):
+        await harness.command('play', 1, 1, f'single guild song {index}')
+    await harness.command('queue', 1, 1)
+    await harness.wait_for_tracks()
+    await harness.command('skip', 1, 1)
+    await asyncio.sleep(0.5)
+    await harness.command('seek', 1, 1, '1')
+    await asyncio.sleep(0.5)
+    await harness.command('previous', 1, 1)
+    await asyncio.sleep(0.5)
+
+
+async def concurrent_users(harness: Harness):
+    """Many users of one guild queue tracks at the same moment"""
+    users = range(1, harness.args.users + 1)
+    await asyncio.gather(*(harness.command('play', 1, user, f'user {user} song') for user in users))
+    await asyncio.gather(*(harness.command('queue', 1, user) for user in users))
+    await harness.wait_for_tracks()
+    await asyncio.gather(*(harness.command('skip', 1, user) for user in list(users)[:2]))
+    await asyncio.sleep(0.5)
+
+
+async def concurrent_guilds(harness: Harness):
+    """Many guilds start playing at once and keep playing through a transition"""
+    guilds = range(1, harness.args.guilds + 1)
+    for index in range(4):
+        await asyncio.gather(*(harness.command('play', guild, guild, f'guild {guild} song {index}') for guild in guilds))
+    await harness.wait_for_tracks()
+    await asyncio.gather(*(harness.command('queue', guild, guild) for guild in guilds))
+    await asyncio.gather(*(harness.command('skip', guild, guild) for guild in guilds))
+    await asyncio.sleep(0.5)
+
+
+SCENARIOS = {
+    'single_guild': single_guild,
+    'concurrent_users': concurrent_users,
+    'concurrent_guilds': concurrent_guilds,
+}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {}
+    names = SCENARIOS if args.scenario == 'all' else [args.scenario]
+    for name in names:
+        extractor = FakeExtractor(args.extract_latency, args.track_seconds)
+        resolver._extract = extractor
+        harness = Harness(args)
+        music_manager.create_audio_source = harness.audio_source
+        start_time = time.perf_counter()
+        await SCENARIOS[name](harness)
+        results[name] = harness.report()
+        results[name]['wall_seconds'] = time.perf_counter() - start_time
+        results[name]['extractions'] = extractor.calls
+        await harness.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=['all', *SCENARIOS], default='all')
+    parser.add_argument('--guilds', type=int, default=8)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--extract-latency', type=float, default=0.3)
+    parser.add_argument('--http-latency', type=float, default=0.05)
+    parser.add_argument('--connect-latency', type=float, default=0.2)
+    parser.add_argument('--track-seconds', type=float, default=2.0)
+    parser.add_argument('--ffmpeg-latency', type=float, default=0.15)
+    parser.add_argument('--gapless', action='store_true')
+    args = parser.parse_args()
+
+    logger.remove()
+    JournalConfig.ENABLED = False
+    audio_cache.enabled = False
+    loudness_index.enabled = False
+    resolver.cache = None
+    GaplessConfig.ENABLED = args.gapless
+
+    results = asyncio.run(run(args))
+    print(json.dumps({'config': vars(args), 'scenarios': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Compare CPU cost per stream of Opus passthrough and PCM playback
+
+Usage:
+    python -m benchmarks.bench_playback_mode <opus/webm file or stream URL> [--streams 4] [--seconds 60]
+
+Each stream is read frame by frame as fast as ffmpeg delivers it, so the result is CPU
+seconds per second of audio. PCM frames are encoded with discord.py's Opus encoder the
+way the voice client does it, Opus frames are sent as they are. Prints one JSON document.
+"""
+import argparse
+import json
+import resource
+import threading
+import time
+
+import discord
+from discord.opus import Encoder
+
+from discord_bot_libs.constants import PlaybackMode
+
+
+FRAME_SECONDS = 0.02
+
+
+def cpu_seconds() -> float:
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage_self.ru_utime + usage_self.ru_stime + usage_children.ru_utime + usage_children.ru_stime
+
+
+def build_source(mode: str, source: str, seconds: int) -> discord.AudioSource:
+    options = f'-vn -t {seconds}'
+    if mode == PlaybackMode.PCM:
+        return discord.FFmpegPCMAudio(source, options=options)
+    return discord.FFmpegOpusAudio(source, codec='opus', options=options)
+
+
+def consume(audio_source: discord.AudioSource, frames: list):
+    encoder = None if audio_source.is_opus() else Encoder()
+    count = 0
+    while True:
+        data = audio_source.read()
+        if not data:
+            break
+        if encoder:
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        count += 1
+    audio_source.cleanup()
+    frames.append(count)
+
+
+def run_mode(mode: str, source: str, streams: int, seconds: int) -> dict:
+    frames = []
+    cpu_before = cpu_seconds()
+    wall_before = time.perf_counter()
+    threads = [
+        threading.Thread(target=consume, args=(build_source(mode, source, seconds), frames))
+        for _ in range(streams)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cpu = cpu_seconds() - cpu_before
+    audio_seconds = sum(frames) * FRAME_SECONDS
+    return {
+        'mode': mode,
+        'streams': streams,
+        'audio_seconds': audio_seconds,
+        'wall_seconds': time.perf_counter() - wall_before,
+        'cpu_seconds': cpu,
+        'cpu_seconds_per_stream': cpu / streams,
+        'cpu_per_audio_second': cpu / audio_seconds if audio_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source')
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=60)
+    args = parser.parse_args()
+
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    results = [run_mode(mode, args.source, args.streams, args.seconds) for mode in (PlaybackMode.PCM, PlaybackMode.OPUS)]
+    pcm, opus = results
+    if pcm['cpu_per_audio_second'] and opus['cpu_per_audio_second']:
+        saving = 1 - opus['cpu_per_audio_second'] / pcm['cpu_per_audio_second']
+    else:
+        saving = None
+    print(json.dumps({'results': results, 'cpu_saving': saving}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Positional queue operations on a deque and on TrackQueue
+
+Usage:
+    python -m benchmarks.bench_track_queue [--sizes 10000 100000] [--ops 2000]
+
+Every operation works on a queue of the given size at random positions. The deque side is
+what MusicState used before, membership on it is a scan. Prints one JSON document with
+microseconds per operation.
+"""
+import argparse
+import json
+import random
+import time
+from collections import deque
+
+from discord_bot_api.model.track_queue import TrackQueue
+
+
+def key(item: int) -> str:
+    return str(item)
+
+
+def timed(operation, positions: list) -> float:
+    start_time = time.perf_counter()
+    for position in positions:
+        operation(position)
+    return (time.perf_counter() - start_time) / len(positions) * 1e6
+
+
+def run_deque(size: int, positions: list) -> dict:
+    queue = deque(range(size))
+
+    def insert(position):
+        queue.insert(position, -1)
+        del queue[position]
+
+    def move(position):
+        item = queue[position]
+        del queue[position]
+        queue.insert(size - 1 - position, item)
+
+    keys = [key(position) for position in positions]
+    return {
+        'insert_remove': timed(insert, positions),
+        'move': timed(move, positions),
+        'get': timed(lambda position: queue[position], positions),
+        'contains': timed(lambda position: any(key(item) == keys[position % len(keys)] for item in queue), positions[:50]),
+        'shuffle': timed(lambda _: random.shuffle(queue), positions[:5]),
+    }
+
+
+def run_track_queue(size: int, positions: list) -> dict:
+    queue = TrackQueue(range(size), key=key)
+
+    def insert(position):
+        queue.insert(position, -1)
+        queue.pop(position)
+
+    keys = [key(position) for position in positions]
+    return {
+        'insert_remove': timed(insert, positions),
+        'move': timed(lambda position: queue.move(position, size - 1 - position), positions),
+        'get': timed(lambda position: queue[position], positions),
+        'contains': timed(lambda position: queue.contains(keys[position % len(keys)]), positions),
+        'shuffle': timed(lambda _: queue.shuffle(), positions[:5]),
+        'dedupe': timed(lambda _: queue.dedupe(), positions[:5]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for size in args.sizes:
+        positions = [rng.randrange(size) for _ in range(args.ops)]
+        results.append({
+            'size': size,
+            'deque_us': run_deque(size, positions),
+            'track_queue_us': run_track_queue(size, positions),
+        })
+    print(json.dumps({'ops': args.ops, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""The pre-optimisation mappers the benchmarks compare against, fed with tests.fakes.raw_info"""
+from discord_bot_api.model.music_model import MusicInfo
+
+
+def map_validated(info) -> MusicInfo:
+    return MusicInfo(
+        title=info['title'],
+        url=info['url'],
+        thumbnail=info['thumbnail'],
+        webpage_url=info['webpage_url'],
+        duration=info['duration'],
+
+        video_id=info.get('id') or info['webpage_url'],
+        view_count=info.get('view_count', 0),
+        like_count=info.get('like_count', 0),
+        channel=info.get('uploader', 'Unknown'),
+        channel_url=info.get('uploader_url', ''),
+        upload_date=info.get('upload_date', ''),
+        description=info.get('description', ''),
+        codec=info.get('acodec'),
+        bitrate=int(info['abr']) if info.get('abr') else None
+    )
@@ -1,9 +1,17 @@
+import asyncio
+
 import discord
+from discord import app_commands
 from discord.ext import commands
 from loguru import logger
 
 from config import SERVER_ID
-from discord_bot_libs.constants import Author
+from discord_bot_libs.autocomplete import query_autocomplete
+from discord_bot_libs.constants import Author, WatchdogConfig
+from discord_bot_libs.metrics import loop_lag_monitor
+from discord_bot_libs.resolver import resolver
+from discord_bot_libs.startup_profile import startup_profile
+from discord_bot_libs.stall_watchdog import stall_watchdog
 from discord_bot_libs.manager import bot_manager, music_manager
 
 
@@ -14,14 +22,30 @@ class Client(commands.Bot):
 
     async def on_ready(self):
         """Called when bot is ready"""
-        await Author.initialize(client)
-        try:
-            guild = discord.Object(id=SERVER_ID)
-            synced = await self.tree.sync(guild=guild)
-            logger.info(f"Synced {len(synced)} command(s)")
-            logger.info(f"Bot is ready as {self.user}")
-        except Exception as e:
-            logger.error(f"Failed to sync commands: {e}")
+        loop_lag_monitor.start()
+        if WatchdogConfig.ENABLED:
+            stall_watchdog.start()
+        resolver.warm_up()
+        # Independent HTTP round trips, wait for the slower one instead of their sum
+        await asyncio.gather(self._initialize_author(), self._sync_commands())
+        logger.info(f"Bot is ready as {self.user}")
+        startup_profile.mark('commands_synced')
+        with startup_profile.phase('restore_sessions'):
+            await music_manager.restore_sessions(self)
+        startup_profile.finish()
+
+    async def _initialize_author(self):
+        with startup_profile.phase('author'):
+            await Author.initialize(self)
+
+    async def _sync_commands(self):
+        with startup_profile.phase('tree.sync'):
+            try:
+                guild = discord.Object(id=SERVER_ID)
+                synced = await self.tree.sync(guild=guild)
+                logger.info(f"Synced {len(synced)} command(s)")
+            except Exception as e:
+                logger.error(f"Failed to sync commands: {e}")
 
     async def on_message(self, message):
         if message.author == self.user:
@@ -65,6 +89,10 @@ async def play_music(interaction: discord.Interaction, query: str):
     await interaction.response.defer()
     await music_manager.play(interaction, query)
 
+@play_music.autocomplete('query')
+async def play_query_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    return await query_autocomplete.suggest(interaction.user.id, current)
+
 @client.tree.command(name='skip', description='Chuyển bài kế tiếp', guild=GUILD_ID)
 async def skip_music(interaction: discord.Interaction):
     await interaction.response.defer()
@@ -75,7 +103,32 @@ async def previous_music(interaction: discord.Interaction):
     await interaction.response.defer()
     await music_manager.previous(interaction)
 
+@client.tree.command(name='seek', description='Tua đến vị trí trong bài đang phát (giây hoặc phút:giây)', guild=GUILD_ID)
+async def seek_music(interaction: discord.Interaction, position: str):
+    await interaction.response.defer()
+    await music_manager.seek(interaction, position)
+
 @client.tree.command(name='queue', description='Xem danh sách hàng đợi', guild=GUILD_ID)
 async def queue(interaction: discord.Interaction):
     await interaction.response.defer()
-    await music_manager.queue(interaction)
\ No newline at end of file
+    await music_manager.queue(interaction)
+
+@client.tree.command(name='move', description='Di chuyển bài trong hàng đợi', guild=GUILD_ID)
+async def move_track(interaction: discord.Interaction, source: int, destination: int):
+    await interaction.response.defer()
+    await music_manager.move(interaction, source, destination)
+
+@client.tree.command(name='remove', description='Xóa bài khỏi hàng đợi', guild=GUILD_ID)
+async def remove_track(interaction: discord.Interaction, position: int):
+    await interaction.response.defer()
+    await music_manager.remove(interaction, position)
+
+@client.tree.command(name='shuffle', description='Trộn hàng đợi', guild=GUILD_ID)
+async def shuffle_queue(interaction: discord.Interaction):
+    await interaction.response.defer()
+    await music_manager.shuffle(interaction)
+
+@client.tree.command(name='dedupe', description='Xóa bài trùng trong hàng đợi', guild=GUILD_ID)
+async def dedupe_queue(interaction: discord.Interaction):
+    await interaction.response.defer()
+    await music_manager.dedupe(interaction)
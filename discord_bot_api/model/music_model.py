@@ -1,11 +1,15 @@
-from datetime import datetime
+import sys
+import time
 from loguru import logger
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel
 from typing import List, Optional
 
 from collections import deque
 import discord
 
+from discord_bot_api.model.track_queue import TrackQueue
+from discord_bot_libs.constants import JournalConfig, MusicConfig
+
 class MusicInfo(BaseModel):
     title: str
     url: str
@@ -13,12 +17,15 @@ class MusicInfo(BaseModel):
     webpage_url: str
     duration: int
 
+    video_id: str = ""
     view_count: int = 0
     like_count: int = 0
     channel: str = "Unknown"
     channel_url: str = ""
     upload_date: str = ""
     description: str = ""
+    codec: Optional[str] = None
+    bitrate: Optional[int] = None
     
     def __str__(self):
         minutes, seconds = divmod(self.duration, 60)
@@ -27,34 +34,84 @@ class MusicInfo(BaseModel):
     def _duration(self):
         minutes, seconds = divmod(self.duration, 60)
         return f'{int(minutes)}:{int(seconds):02d}'
-    
 
-class RequestInfo(BaseModel):
-    music_info: MusicInfo
-    requester: discord.Member
-    time: datetime
+    def compact(self) -> 'MusicInfo':
+        """Copy without the stream URL and description, for entries that are not about to play"""
+        return MusicInfo.from_trusted(dict(self.__dict__, url='', description=''))
+
+    @classmethod
+    def from_trusted(cls, fields: dict) -> 'MusicInfo':
+        """Build from data that is already clean, skipping validation
+
+        Installs the field dict directly, which is cheaper than both validation and
+        model_construct. Missing optional fields get their defaults. This sets pydantic 2
+        internals, so requirements.txt pins pydantic 2 and tests/test_music_model.py
+        compares the result with a validated model.
+        """
+        if len(fields) != MUSIC_INFO_FIELD_COUNT:
+            fields = {**MUSIC_INFO_DEFAULTS, **fields}
+        music_info = _new_model(cls)
+        _set_slot(music_info, '__dict__', fields)
+        _set_slot(music_info, '__pydantic_fields_set__', set())
+        _set_slot(music_info, '__pydantic_extra__', None)
+        _set_slot(music_info, '__pydantic_private__', None)
+        return music_info
+
+
+MUSIC_INFO_DEFAULTS = {name: field.default for name, field in MusicInfo.model_fields.items() if not field.is_required()}
+MUSIC_INFO_FIELD_COUNT = len(MusicInfo.model_fields)
+_new_model = object.__new__
+_set_slot = object.__setattr__
+
+
+class RequestInfo:
+    """A queued or played track
+
+    Keeps the requester's id and the two fields the UI shows instead of pinning the
+    discord.Member, use get_requester to look the member up again.
+    """
+    __slots__ = ('music_info', 'requester_id', 'requester_name', 'requester_avatar', 'requested_at')
+
+    def __init__(self, music_info: MusicInfo, requester_id: int, requester_name: str, requester_avatar: str, requested_at: float):
+        self.music_info = music_info
+        self.requester_id = requester_id
+        self.requester_name = requester_name
+        self.requester_avatar = requester_avatar
+        self.requested_at = requested_at
+
+    def get_requester(self, guild: discord.Guild) -> Optional[discord.Member]:
+        return guild.get_member(self.requester_id)
 
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+    def compact(self) -> 'RequestInfo':
+        return RequestInfo(self.music_info.compact(), self.requester_id, self.requester_name, self.requester_avatar, self.requested_at)
 
 
 
 class MusicState:
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(MusicState, cls).__new__(cls)
-            cls._instance._queue = deque()
-            cls._instance._history = deque()
-            cls._instance._current_message = None
-            cls._instance._is_playing = False
-            cls._instance._current_track = None
-        return cls._instance
+    """Queue and history of one guild, both bounded so a guild can not grow without limit"""
+    def __init__(self, max_queue_length: int = MusicConfig.MAX_QUEUE_LENGTH, max_history_length: int = MusicConfig.MAX_HISTORY_LENGTH):
+        self.max_queue_length = max_queue_length
+        self._queue: TrackQueue[RequestInfo] = TrackQueue(key=track_key)
+        self._history = deque(maxlen=max_history_length)
+        self._current_message = None
+        self._is_playing = False
+        self._current_track = None
+        self._position = 0
+        self.resume_position = 0
+        self._resume_key = None
+        self.journal = None
+        self.version = 0  # Bumped on every queue or history change, rendered views compare it
+        self.head_version = 0  # Bumped only when a different track is at the front of the queue
+        self._head = None
     
     @property
     def current_message(self) -> Optional[discord.Message]:
         return self._current_message
     
+    @property
+    def current_track(self) -> Optional[RequestInfo]:
+        return self._current_track
+
     @property
     def is_playing(self) -> bool:
         return self._is_playing
@@ -67,70 +124,267 @@ class MusicState:
     def current_message(self, message: discord.Message):
         self._current_message = message
     
+    def _changed(self):
+        self.version += 1
+        head = self._queue[0] if self._queue else None
+        if head is not self._head:
+            self._head = head
+            self.head_version += 1
+
     def next_track(self):
         if self._queue:
             track = self._queue.popleft()
             self._current_track = track
+            self._position = 0
+            self._changed()
+            self._record('next')
             self.add_to_history(track)
             return track
+        self.stop()
         return None
+
+    def stop(self):
+        """Nothing is playing any more, so a restore must not bring the last track back"""
+        if self._current_track is None:
+            return
+        self._current_track = None
+        self._position = 0
+        self._changed()
+        self._record('stop')
     
+    def advance_to(self, request_info: RequestInfo):
+        """Make a track that already started playing current, popping it when it is still at the front"""
+        if self._queue and self._queue[0] is request_info:
+            self.next_track()
+            return
+        # The queue changed under the hand-over, journal the track itself rather than a pop
+        self._current_track = request_info
+        self._position = 0
+        self._changed()
+        self._record('current', track=request_to_record(request_info))
+        self.add_to_history(request_info)
+
     def remove_previous_track(self) -> Optional[RequestInfo]:
         if self._history:
             track = self._history.popleft()
+            self._changed()
+            self._record('previous')
             return track
         return None
     
-    def add_track(self, request_info: RequestInfo, position: int = -1):
+    def is_full(self) -> bool:
+        return len(self._queue) >= self.max_queue_length
+
+    def add_track(self, request_info: RequestInfo, position: int = -1) -> Optional[int]:
+        if self.is_full():
+            return None
         if position == -1:
             self._queue.append(request_info)
-        elif position >= len(self._queue):
-            self._queue.append(request_info)
         else:
             self._queue.insert(position, request_info)
+        self._changed()
+        self._record('add', pos=position, track=request_to_record(request_info))
         return position if position != -1 else len(self._queue)
     
     def remove_track(self, position: int):
         if 0 <= position < len(self._queue):
-            return self._queue.pop(position)
+            track = self._queue.pop(position)
+            self._changed()
+            self._record('remove', pos=position)
+            return track
         return None
+
+    def move_track(self, source: int, destination: int) -> Optional[RequestInfo]:
+        if not (0 <= source < len(self._queue) and 0 <= destination < len(self._queue)):
+            return None
+        track = self._queue.move(source, destination)
+        self._changed()
+        self._record('move', src=source, dst=destination)
+        return track
+
+    def shuffle_queue(self):
+        self._queue.shuffle()
+        self._changed()
+        self._save_snapshot()
+
+    def dedupe_queue(self) -> int:
+        """Drop later copies of tracks that are queued more than once, returns how many were removed"""
+        removed = self._queue.dedupe()
+        if removed:
+            self._changed()
+            self._save_snapshot()
+        return len(removed)
+
+    def has_track(self, video_id: str) -> bool:
+        return self._queue.contains(video_id)
     
+    def queue_length(self) -> int:
+        return len(self._queue)
+
     def get_queue(self) -> List[RequestInfo]:
         return list(self._queue)
+
+    def get_queue_slice(self, start: int, stop: int) -> List[RequestInfo]:
+        return list(self._queue.islice(start, stop))
     
     def get_history(self) -> List[RequestInfo]:
         return list(self._history)
     
     def clear_queue(self):
         self._queue.clear()
+        self._changed()
+        self._record('clear_queue')
     
     def add_to_history(self, request_info: RequestInfo):
         logger.debug(f"Add to history: {request_info.music_info.title}")
-        self._history.appendleft(request_info)
+        self._history.appendleft(request_info.compact())
+        self._changed()
+        self._record('history', track=request_to_record(request_info))
     
     def clear_history(self):
         self._history.clear()
+        self._changed()
+        self._record('clear_history')
+
+    def record_position(self, seconds: int):
+        """Remember how far the current track got, journaled at most every POSITION_INTERVAL seconds"""
+        if abs(seconds - self._position) >= JournalConfig.POSITION_INTERVAL:
+            self._position = seconds
+            self._record('position', t=seconds)
+
+    def take_resume_position(self, request_info: RequestInfo) -> int:
+        """Where the track interrupted by the last shutdown stopped, once and only for that track"""
+        position = self.resume_position if self._resume_key == track_key(request_info) else 0
+        self.resume_position = 0
+        self._resume_key = None
+        return position
+
+    def attach_journal(self, journal):
+        journal.start(self.snapshot())
+        self.journal = journal
+
+    def detach_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def _record(self, op: str, **data):
+        if self.journal and self.journal.append(op, **data):
+            self.journal.write_snapshot(self.snapshot())
+
+    def _save_snapshot(self):
+        """Journal a reordering of the whole queue as a fresh snapshot instead of an operation"""
+        if self.journal:
+            self.journal.write_snapshot(self.snapshot())
+
+    def snapshot(self) -> dict:
+        return {
+            'queue': [request_to_record(track) for track in self._queue],
+            'history': [request_to_record(track) for track in self._history],
+            'current': request_to_record(self._current_track) if self._current_track else None,
+            'position': self._position,
+        }
 
+    def restore(self, state: dict):
+        """Load replayed journal state, the interrupted track goes back to the front of the queue"""
+        self._queue.extend(record_to_request(record) for record in state['queue'])
+        history = list(state['history'])
+        current = state['current']
+        if current:
+            if history and history[0] == current:
+                history.pop(0)
+            self._queue.appendleft(record_to_request(current))
+            self.resume_position = state['position']
+            self._resume_key = track_key(self._queue[0])
+        self._history.extend(record_to_request(record) for record in history)
+        self._changed()
+
+
+def track_key(request_info: RequestInfo) -> str:
+    return request_info.music_info.video_id or request_info.music_info.webpage_url
 
 def map_music_info(info) -> MusicInfo:
-    return MusicInfo(
-        title=info['title'],
-        url=info['url'],
-        thumbnail=info['thumbnail'],
-        webpage_url=info['webpage_url'],
-        duration=info['duration'],
-
-        view_count=info.get('view_count', 0),
-        like_count=info.get('like_count', 0),
-        channel=info.get('uploader', 'Unknown'),
-        channel_url=info.get('uploader_url', ''),
-        upload_date=info.get('upload_date', ''),
-        description=info.get('description', '')
+    """Map trusted yt-dlp output without pydantic validation
+
+    The description is dropped since nothing reads it and channel names are interned,
+    the same few channels come back for most tracks.
+    """
+    abr = info.get('abr')
+    return MusicInfo.from_trusted({
+        'title': info['title'],
+        'url': info['url'],
+        'thumbnail': info.get('thumbnail') or '',
+        'webpage_url': info['webpage_url'],
+        'duration': int(info.get('duration') or 0),
+
+        'video_id': info.get('id') or info['webpage_url'],
+        'view_count': info.get('view_count') or 0,
+        'like_count': info.get('like_count') or 0,
+        'channel': sys.intern(info.get('uploader') or 'Unknown'),
+        'channel_url': sys.intern(info.get('uploader_url') or ''),
+        'upload_date': info.get('upload_date') or '',
+        'description': '',
+        'codec': info.get('acodec'),
+        'bitrate': int(abr) if abr else None,
+    })
+
+def map_playlist_entry(entry) -> MusicInfo:
+    """Map a flat playlist entry, the stream URL is left empty until the track is resolved"""
+    thumbnails = entry.get('thumbnails') or []
+    return MusicInfo.from_trusted({
+        'title': entry.get('title') or entry['url'],
+        'url': '',
+        'thumbnail': thumbnails[-1]['url'] if thumbnails else '',
+        'webpage_url': entry['url'],
+        'duration': int(entry.get('duration') or 0),
+
+        'video_id': entry.get('id') or entry['url'],
+        'view_count': entry.get('view_count') or 0,
+        'channel': sys.intern(entry.get('channel') or entry.get('uploader') or 'Unknown'),
+    })
+
+def request_to_record(request_info: RequestInfo) -> dict:
+    """Journal record of a request, without the stream URL which expires anyway"""
+    music_info = request_info.music_info
+    return {
+        'id': music_info.video_id,
+        'title': music_info.title,
+        'webpage_url': music_info.webpage_url,
+        'thumbnail': music_info.thumbnail,
+        'duration': music_info.duration,
+        'channel': music_info.channel,
+        'view_count': music_info.view_count,
+        'requester': request_info.requester_id,
+        'requester_name': request_info.requester_name,
+        'requester_avatar': request_info.requester_avatar,
+        'time': request_info.requested_at,
+    }
+
+def record_to_request(record: dict) -> RequestInfo:
+    music_info = MusicInfo.from_trusted({
+        'title': record['title'],
+        'url': '',
+        'thumbnail': record['thumbnail'],
+        'webpage_url': record['webpage_url'],
+        'duration': record['duration'],
+
+        'video_id': record['id'],
+        'view_count': record['view_count'],
+        'channel': sys.intern(record['channel']),
+    })
+    return RequestInfo(
+        music_info=music_info,
+        requester_id=record['requester'],
+        requester_name=record.get('requester_name', 'Unknown'),
+        requester_avatar=record.get('requester_avatar', ''),
+        requested_at=record['time'],
     )
 
-def map_request_info(music_info: MusicInfo, requester: discord.Member, time: datetime = datetime.now()) -> RequestInfo:
+def map_request_info(music_info: MusicInfo, requester: discord.Member, requested_at: Optional[float] = None) -> RequestInfo:
     return RequestInfo(
         music_info=music_info,
-        requester=requester,
-        time=time
+        requester_id=requester.id,
+        requester_name=requester.display_name,
+        requester_avatar=sys.intern(requester.display_avatar.url),
+        requested_at=requested_at or time.time()
     )
\ No newline at end of file
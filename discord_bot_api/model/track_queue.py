@@ -0,0 +1,195 @@
+import random
+from collections import Counter
+from itertools import chain, islice
+from typing import Callable, Generic, Iterable, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar('T')
+
+
+class TrackQueue(Generic[T]):
+    """Positional queue for long playlists, a list of blocks indexed by a Fenwick tree
+
+    Finding a position walks the Fenwick tree over block lengths in O(log n) and then
+    inserts or removes inside one block of at most 2 * BLOCK_SIZE items, so insert, remove
+    and move by position stay cheap where a deque would shift half the queue. The number
+    of queued items per key (the video id) is counted, which makes membership O(1).
+    """
+    BLOCK_SIZE = 256
+
+    def __init__(self, items: Iterable[T] = (), key: Callable[[T], str] = str):
+        self.key = key
+        self._blocks: List[List[T]] = []
+        self._tree: List[int] = [0]
+        self._length = 0
+        self._counts: Counter = Counter()
+        self._build(list(items))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __iter__(self) -> Iterator[T]:
+        return chain.from_iterable(self._blocks)
+
+    def __getitem__(self, index: int) -> T:
+        block, offset = self._locate(self._normalize(index))
+        return self._blocks[block][offset]
+
+    def __delitem__(self, index: int):
+        self.pop(index)
+
+    def contains(self, key: str) -> bool:
+        return self._counts[key] > 0
+
+    def count(self, key: str) -> int:
+        return self._counts[key]
+
+    def append(self, item: T):
+        if not self._blocks or len(self._blocks[-1]) >= 2 * self.BLOCK_SIZE:
+            self._blocks.append([item])
+            self._rebuild_index()
+        else:
+            self._blocks[-1].append(item)
+            self._update(len(self._blocks) - 1, 1)
+        self._length += 1
+        self._counts[self.key(item)] += 1
+
+    def appendleft(self, item: T):
+        self.insert(0, item)
+
+    def extend(self, items: Iterable[T]):
+        for item in items:
+            self.append(item)
+
+    def insert(self, index: int, item: T):
+        """Insert before index, like list.insert an index past the end appends"""
+        if index < 0:
+            index = max(0, self._length + index)
+        if index >= self._length:
+            self.append(item)
+            return
+        block, offset = self._locate(index)
+        self._blocks[block].insert(offset, item)
+        self._length += 1
+        self._counts[self.key(item)] += 1
+        if len(self._blocks[block]) > 2 * self.BLOCK_SIZE:
+            self._split(block)
+        else:
+            self._update(block, 1)
+
+    def pop(self, index: int = -1) -> T:
+        block, offset = self._locate(self._normalize(index))
+        item = self._blocks[block].pop(offset)
+        self._length -= 1
+        self._discard_key(self.key(item))
+        if self._blocks[block]:
+            self._update(block, -1)
+        else:
+            del self._blocks[block]
+            self._rebuild_index()
+        return item
+
+    def popleft(self) -> T:
+        return self.pop(0)
+
+    def move(self, source: int, destination: int) -> T:
+        """Move the item at source so that it ends up at destination"""
+        item = self.pop(source)
+        self.insert(self._normalize_insert(destination), item)
+        return item
+
+    def islice(self, start: int, stop: int) -> Iterator[T]:
+        """Iterate positions start to stop without walking the blocks in front of start"""
+        start = max(start, 0)
+        if start >= self._length or stop <= start:
+            return iter(())
+        block, offset = self._locate(start)
+        items = chain(islice(self._blocks[block], offset, None), chain.from_iterable(self._blocks[block + 1:]))
+        return islice(items, stop - start)
+
+    def shuffle(self, rng: Optional[random.Random] = None):
+        """Shuffle all items in O(n), the blocks are refilled evenly"""
+        items = list(self)
+        (rng or random).shuffle(items)
+        self._build(items, recount=False)
+
+    def dedupe(self) -> List[T]:
+        """Keep the first item of every key, returns the removed items"""
+        seen = set()
+        kept, removed = [], []
+        for item in self:
+            key = self.key(item)
+            if key in seen:
+                removed.append(item)
+            else:
+                seen.add(key)
+                kept.append(item)
+        if removed:
+            self._build(kept)
+        return removed
+
+    def clear(self):
+        self._build([])
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('TrackQueue index out of range')
+        return index
+
+    def _normalize_insert(self, index: int) -> int:
+        return max(0, self._length + index) if index < 0 else index
+
+    def _discard_key(self, key: str):
+        count = self._counts[key] - 1
+        if count:
+            self._counts[key] = count
+        else:
+            del self._counts[key]
+
+    def _build(self, items: List[T], recount: bool = True):
+        size = self.BLOCK_SIZE
+        self._blocks = [items[start:start + size] for start in range(0, len(items), size)]
+        self._length = len(items)
+        if recount:
+            self._counts = Counter(map(self.key, items))
+        self._rebuild_index()
+
+    def _split(self, block: int):
+        items = self._blocks[block]
+        half = len(items) // 2
+        self._blocks[block:block + 1] = [items[:half], items[half:]]
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Build the Fenwick tree over block lengths in O(number of blocks)"""
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, block: int, delta: int):
+        tree = self._tree
+        i = block + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """Block number and offset of a valid position"""
+        tree = self._tree
+        position = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            next_position = position + step
+            if next_position < len(tree) and tree[next_position] <= index:
+                position = next_position
+                index -= tree[next_position]
+            step >>= 1
+        return position, index
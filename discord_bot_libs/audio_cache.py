@@ -0,0 +1,172 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.constants import FFMPEG_OPTIONS, AudioCacheConfig
+from discord_bot_libs.metrics import metrics
+
+
+SAFE_ID_PATTERN = re.compile(r'[\w-]+')
+
+
+class AudioCacheEntry:
+    __slots__ = ('path', 'size', 'play_count', 'last_played')
+
+    def __init__(self, path: str, size: int, play_count: int, last_played: float):
+        self.path = path
+        self.size = size
+        self.play_count = play_count
+        self.last_played = last_played
+
+    def score(self, now: float) -> float:
+        """Play count decayed by how long ago the track was last played"""
+        return self.play_count * 0.5 ** ((now - self.last_played) / AudioCacheConfig.HALF_LIFE)
+
+
+class AudioCache:
+    """Local Opus copies of tracks that get replayed, keyed by video id and bounded by a byte budget
+
+    A track is downloaded in the background the MIN_PLAYS-th time it is played. When the
+    budget is exceeded the entries with the lowest decayed play count are evicted. Play
+    counts of tracks that are not cached yet live in memory only.
+    """
+    def __init__(self, directory: str = AudioCacheConfig.DIRECTORY, max_bytes: int = AudioCacheConfig.MAX_BYTES, enabled: bool = AudioCacheConfig.ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, AudioCacheEntry] = {}
+        self._play_counts: OrderedDict[str, int] = OrderedDict()
+        self._downloading: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._total_bytes = 0
+        if enabled:
+            self._load()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for item in os.scandir(self.directory):
+            if item.name.endswith('.part'):
+                os.remove(item.path)
+            elif item.name.endswith('.opus'):
+                stat = item.stat()
+                self._entries[item.name[:-5]] = AudioCacheEntry(item.path, stat.st_size, 1, stat.st_mtime)
+                self._total_bytes += stat.st_size
+        logger.info(f"Audio cache loaded {len(self._entries)} tracks, {self._total_bytes / 1024 / 1024:.1f} MB")
+
+    def contains(self, video_id: str) -> bool:
+        return video_id in self._entries
+
+    def size_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit_rate(self) -> float:
+        plays = self.hits + self.misses
+        return self.hits / plays if plays else 0.0
+
+    def local_path(self, music_info: MusicInfo) -> Optional[str]:
+        """The cached file of a track without counting a play, for seeking within it"""
+        entry = self._entries.get(music_info.video_id) if self.enabled and music_info.video_id else None
+        return entry.path if entry and os.path.exists(entry.path) else None
+
+    def record_play(self, music_info: MusicInfo) -> Optional[str]:
+        """Count a play, returns the local file when the track is cached"""
+        if not self.enabled or not music_info.video_id:
+            return None
+        video_id = music_info.video_id
+        entry = self._entries.get(video_id)
+        if entry is not None:
+            if os.path.exists(entry.path):
+                entry.play_count += 1
+                entry.last_played = time.time()
+                self.hits += 1
+                return entry.path
+            self._remove(video_id)
+
+        self.misses += 1
+        play_count = self._play_counts.pop(video_id, 0) + 1
+        self._play_counts[video_id] = play_count
+        while len(self._play_counts) > AudioCacheConfig.MAX_TRACKED_PLAYS:
+            self._play_counts.popitem(last=False)
+
+        if play_count >= AudioCacheConfig.MIN_PLAYS and self._should_download(music_info):
+            self._downloading.add(video_id)
+            task = asyncio.create_task(self._download(music_info, play_count))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return None
+
+    def _should_download(self, music_info: MusicInfo) -> bool:
+        return (
+            bool(music_info.url)
+            and SAFE_ID_PATTERN.fullmatch(music_info.video_id) is not None
+            and music_info.video_id not in self._downloading
+            and 0 < music_info.duration <= AudioCacheConfig.MAX_TRACK_SECONDS
+        )
+
+    async def _download(self, music_info: MusicInfo, play_count: int):
+        video_id = music_info.video_id
+        path = os.path.join(self.directory, f'{video_id}.opus')
+        part_path = f'{path}.part'
+        codec = 'copy' if music_info.codec in ('opus', 'libopus') else 'libopus'
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(AudioCacheConfig.MAX_DOWNLOADS)
+        try:
+            async with self._semaphore:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', *FFMPEG_OPTIONS['before_options'].split(),
+                    '-i', music_info.url, '-vn', '-map_metadata', '-1',
+                    '-c:a', codec, '-b:a', '128k', '-f', 'opus', '-loglevel', 'error', '-y', part_path,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, stderr = await process.communicate()
+            if process.returncode != 0:
+                logger.warning(f"Audio cache download failed for {music_info.title}: {stderr.decode(errors='ignore').strip()}")
+                return
+            os.replace(part_path, path)
+            size = os.path.getsize(path)
+            self._entries[video_id] = AudioCacheEntry(path, size, play_count, time.time())
+            self._play_counts.pop(video_id, None)
+            self._total_bytes += size
+            logger.info(f"Cached audio for {music_info.title}, {size / 1024:.0f} KB")
+            self._evict()
+        except Exception as e:
+            logger.error(f"Error caching audio for {music_info.title}: {e}")
+        finally:
+            self._downloading.discard(video_id)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def _evict(self):
+        now = time.time()
+        while self._total_bytes > self.max_bytes and self._entries:
+            video_id = min(self._entries, key=lambda key: self._entries[key].score(now))
+            self._remove(video_id)
+
+    def _remove(self, video_id: str):
+        entry = self._entries.pop(video_id)
+        self._total_bytes -= entry.size
+        try:
+            # ffmpeg processes still reading the file keep their handle
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+audio_cache = AudioCache()
+metrics.gauge('discord_bot_audio_cache_tracks', 'Tracks stored in the on-disk audio cache', callback=audio_cache.__len__)
+metrics.gauge('discord_bot_audio_cache_bytes', 'Size of the on-disk audio cache', callback=audio_cache.size_bytes)
+metrics.gauge('discord_bot_audio_cache_hit_ratio', 'Share of plays served from the audio cache', callback=audio_cache.hit_rate)
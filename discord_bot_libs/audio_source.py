@@ -0,0 +1,167 @@
+import time
+from collections import deque
+from typing import Optional
+
+import discord
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.constants import FFMPEG_OPTIONS, AudioConfig, MetricsConfig, PlaybackMode
+from discord_bot_libs.loudness import TrackAnalysis
+from discord_bot_libs.metrics import metrics
+
+
+OPUS_CODECS = ('opus', 'libopus')
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+FIRST_FRAME_SECONDS = metrics.histogram('discord_bot_ffmpeg_first_frame_seconds', 'Time from spawning ffmpeg to reading its first audio frame')
+TRACK_GAP_SECONDS = metrics.histogram('discord_bot_track_gap_seconds', 'Silence between the last frame of a track that ended and the first frame of the next', MetricsConfig.GAP_BUCKETS)
+
+
+class PlaybackSource(discord.AudioSource):
+    """Passes frames through, counts them for the playback position and times the first one
+
+    The voice client reads one 20 ms frame per packet it sends, so the frame count is the
+    audio actually played: it stops while paused and starts from offset after a seek.
+    When gap_since holds the moment the previous track ran out, the silence until this
+    source's first frame is recorded as the track gap.
+    """
+    def __init__(self, source: discord.AudioSource, started_at: Optional[float], offset: float = 0.0, end: Optional[float] = None):
+        self.source = source
+        self.started_at = started_at
+        self.offset = offset
+        self.end = end
+        self.frames = 0
+        self.gap_since: Optional[float] = None
+        self.gap: Optional[float] = None
+        self.ended_at: Optional[float] = None
+
+    @property
+    def position(self) -> float:
+        return self.offset + self.frames * FRAME_SECONDS
+
+    def remaining(self) -> Optional[float]:
+        return self.end - self.position if self.end else None
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if not data:
+            self.ended_at = time.perf_counter()
+            return data
+        if not self.frames:
+            self._first_frame()
+        self.frames += 1
+        return data
+
+    def _first_frame(self):
+        now = time.perf_counter()
+        if self.started_at is not None:
+            FIRST_FRAME_SECONDS.observe(now - self.started_at)
+            self.started_at = None
+        if self.gap_since is not None:
+            self.gap = now - self.gap_since
+            TRACK_GAP_SECONDS.observe(self.gap)
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class FrameBuffer(discord.AudioSource):
+    """Frames read ahead from a source, served before reading on"""
+    def __init__(self, source: discord.AudioSource):
+        self.source = source
+        self.frames: deque[bytes] = deque()
+
+    def fill(self, count: int):
+        while len(self.frames) < count:
+            data = self.source.read()
+            if not data:
+                break
+            self.frames.append(data)
+
+    def read(self) -> bytes:
+        return self.frames.popleft() if self.frames else self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+def prebuffer(playback: PlaybackSource, frames: int):
+    """Let ffmpeg connect and decode the first frames ahead of time, blocks so call it from a worker thread"""
+    buffer = FrameBuffer(playback.source)
+    buffer.fill(frames)
+    playback.source = buffer
+    if playback.started_at is not None and buffer.frames:
+        FIRST_FRAME_SECONDS.observe(time.perf_counter() - playback.started_at)
+    playback.started_at = None
+
+
+async def probe_codec(music_info: MusicInfo) -> Optional[str]:
+    """Fill in codec and bitrate with ffprobe when yt-dlp did not report them"""
+    if music_info.codec is None:
+        try:
+            music_info.codec, music_info.bitrate = await discord.FFmpegOpusAudio.probe(music_info.url)
+        except Exception as e:
+            logger.warning(f"Failed to probe {music_info.title}: {e}")
+    return music_info.codec
+
+
+async def create_audio_source(music_info: MusicInfo, mode: str = AudioConfig.PLAYBACK_MODE, local_path: Optional[str] = None, analysis: Optional[TrackAnalysis] = None, start: float = 0.0) -> PlaybackSource:
+    """Build the ffmpeg source for a track
+
+    Opus sources are stream-copied with FFmpegOpusAudio so neither ffmpeg nor discord.py
+    decodes and re-encodes them. Everything else falls back to FFmpegPCMAudio in auto mode.
+    local_path plays a file from the audio cache instead of the stream URL. A loudness
+    analysis trims the silent intro and outro and, when its gain is large enough, applies
+    a static volume, which costs the Opus stream copy an ffmpeg encode. start seeks the
+    input, seconds into the track.
+    """
+    codec = None
+    if not local_path and mode != PlaybackMode.PCM:
+        codec = await probe_codec(music_info)
+    if analysis is not None:
+        start = max(start, analysis.start)
+    end = analysis.end if analysis is not None and analysis.end else music_info.duration
+    started_at = time.perf_counter()
+    return PlaybackSource(_spawn_ffmpeg(music_info, mode, codec, local_path, analysis, start), started_at, start, end)
+
+
+def _ffmpeg_options(local_path: Optional[str], analysis: Optional[TrackAnalysis], start: float = 0.0) -> dict:
+    before_options = '' if local_path else FFMPEG_OPTIONS['before_options']
+    options = FFMPEG_OPTIONS['options']
+    if start:
+        before_options += f' -ss {start:.2f}'
+    if analysis is not None:
+        if analysis.end:
+            options += f' -t {max(0.0, analysis.end - start):.2f}'
+        if analysis.needs_gain():
+            options += f' -af volume={analysis.gain:.2f}dB'
+    return {'before_options': before_options.strip(), 'options': options}
+
+
+def _spawn_ffmpeg(music_info: MusicInfo, mode: str, codec: Optional[str], local_path: Optional[str], analysis: Optional[TrackAnalysis] = None, start: float = 0.0) -> discord.AudioSource:
+    ffmpeg_options = _ffmpeg_options(local_path, analysis, start)
+    # The volume filter needs decoded audio, ffmpeg then encodes Opus instead of copying it
+    reencode = analysis is not None and analysis.needs_gain()
+
+    if local_path:
+        if mode == PlaybackMode.PCM:
+            return discord.FFmpegPCMAudio(local_path, **ffmpeg_options)
+        return discord.FFmpegOpusAudio(local_path, codec=None if reencode else 'opus', **ffmpeg_options)
+
+    if mode == PlaybackMode.PCM:
+        return discord.FFmpegPCMAudio(music_info.url, **ffmpeg_options)
+
+    if mode == PlaybackMode.OPUS or codec in OPUS_CODECS:
+        return discord.FFmpegOpusAudio(
+            music_info.url,
+            codec=None if reencode else codec,
+            bitrate=min(music_info.bitrate or 128, 128),
+            **ffmpeg_options
+        )
+    return discord.FFmpegPCMAudio(music_info.url, **ffmpeg_options)
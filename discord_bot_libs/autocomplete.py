@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import List, Optional
+
+from discord import app_commands
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.constants import AutocompleteConfig
+from discord_bot_libs.music_cache import music_cache
+from discord_bot_libs.resolver import is_playlist, resolver
+
+
+MAX_CHOICE_LENGTH = 100  # Discord limit for both the name and the value of a choice
+MAX_INDEXED_WORDS = 8
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class TitleIndex:
+    """Prefix index over resolved titles, a sorted key list searched with bisect
+
+    Every title is indexed from each of its first words on, so "lofi" also finds
+    "Chill Lofi Mix". The least recently added titles are dropped past max_titles.
+    """
+    def __init__(self, max_titles: int = AutocompleteConfig.MAX_TITLES):
+        self.max_titles = max_titles
+        self._keys: List[tuple[str, str]] = []
+        self._titles: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def add(self, title: str, url: str):
+        if not title or not url:
+            return
+        if url in self._titles:
+            self._titles[url] = (self._titles[url][0], next(self._counter))
+            self._titles.move_to_end(url)
+            return
+        self._titles[url] = (title, next(self._counter))
+        for key in self._index_keys(title):
+            insort(self._keys, (key, url))
+        while len(self._titles) > self.max_titles:
+            old_url, (old_title, _) = self._titles.popitem(last=False)
+            for key in self._index_keys(old_title):
+                index = bisect_left(self._keys, (key, old_url))
+                if index < len(self._keys) and self._keys[index] == (key, old_url):
+                    del self._keys[index]
+
+    def search(self, prefix: str, limit: int) -> List[tuple[str, str]]:
+        """(title, url) of titles with a word run starting with prefix, most recent first"""
+        matches = set()
+        index = bisect_left(self._keys, (prefix, ''))
+        while index < len(self._keys) and self._keys[index][0].startswith(prefix):
+            matches.add(self._keys[index][1])
+            index += 1
+        recent = heapq.nlargest(limit, matches, key=lambda url: self._titles[url][1])
+        return [(self._titles[url][0], url) for url in recent]
+
+    @staticmethod
+    def _index_keys(title: str) -> set:
+        words = normalize_text(title).split(' ')
+        return {' '.join(words[start:]) for start in range(min(len(words), MAX_INDEXED_WORDS))}
+
+
+class QueryAutocomplete:
+    """Suggestions for the /play query, answered from the title index and cached searches
+
+    A search runs at most once per prefix within SEARCH_TTL: finished searches are cached,
+    including failed ones, and concurrent requests for the same prefix share one search.
+    A user who keeps typing within DEBOUNCE does not trigger a search for every keystroke,
+    and an answer never waits past BUDGET, a slow search keeps running for the next call.
+    """
+    def __init__(self, index: Optional[TitleIndex] = None):
+        self.index = index or TitleIndex()
+        self.searches = 0
+        self._cache: OrderedDict[str, tuple[float, List[MusicInfo]]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._latest: dict[int, str] = {}
+        self._seeded = False
+
+    def remember(self, music_info: MusicInfo):
+        """Index a track somebody played"""
+        self.index.add(music_info.title, music_info.webpage_url)
+
+    async def suggest(self, user_id: int, current: str) -> List[app_commands.Choice[str]]:
+        deadline = time.monotonic() + AutocompleteConfig.BUDGET
+        if not self._seeded:
+            await self._seed()
+        prefix = normalize_text(current)
+        if not prefix or is_playlist(current) or current.startswith(('http://', 'https://')):
+            return []
+
+        limit = AutocompleteConfig.MAX_CHOICES
+        suggestions = self.index.search(prefix, limit)
+        if len(suggestions) < limit and len(prefix) >= AutocompleteConfig.MIN_SEARCH_CHARS:
+            seen = {url for _, url in suggestions}
+            for music_info in await self._search(user_id, prefix, deadline):
+                if music_info.webpage_url not in seen and len(suggestions) < limit:
+                    seen.add(music_info.webpage_url)
+                    suggestions.append((music_info.title, music_info.webpage_url))
+        return [
+            app_commands.Choice(name=title[:MAX_CHOICE_LENGTH], value=url)
+            for title, url in suggestions if len(url) <= MAX_CHOICE_LENGTH
+        ]
+
+    async def _search(self, user_id: int, prefix: str, deadline: float) -> List[MusicInfo]:
+        cached = self._cached(prefix)
+        if cached is not None:
+            return cached
+
+        future = self._in_flight.get(prefix)
+        if future is None:
+            self._latest[user_id] = prefix
+            await asyncio.sleep(AutocompleteConfig.DEBOUNCE)
+            latest = self._latest.get(user_id)
+            if latest is not None and latest != prefix:
+                # A newer keystroke of the same user takes over
+                return self._cached(prefix) or []
+            # None when a repeat of this prefix already started the search, it is shared below
+            self._latest.pop(user_id, None)
+            cached = self._cached(prefix)
+            if cached is not None:
+                return cached
+            future = self._in_flight.get(prefix) or self._start_search(prefix)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+        except Exception:
+            # Timed out or failed, _store caches whatever the search ends with
+            return []
+
+    def _start_search(self, prefix: str) -> asyncio.Future:
+        self.searches += 1
+        future = resolver.search(prefix, AutocompleteConfig.SEARCH_RESULTS)
+        self._in_flight[prefix] = future
+        future.add_done_callback(lambda f: self._store(prefix, f))
+        return future
+
+    def _store(self, prefix: str, future: asyncio.Future):
+        self._in_flight.pop(prefix, None)
+        results = []
+        if not future.cancelled():
+            if future.exception():
+                logger.warning(f"Autocomplete search failed for {prefix!r}: {future.exception()}")
+            else:
+                results = future.result()
+        self._cache[prefix] = (time.monotonic() + AutocompleteConfig.SEARCH_TTL, results)
+        self._cache.move_to_end(prefix)
+        while len(self._cache) > AutocompleteConfig.MAX_CACHED_SEARCHES:
+            self._cache.popitem(last=False)
+
+    def _cached(self, prefix: str) -> Optional[List[MusicInfo]]:
+        entry = self._cache.get(prefix)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[prefix]
+            return None
+        return entry[1]
+
+    async def _seed(self):
+        """Load recently resolved titles from the music cache once"""
+        self._seeded = True
+        rows = await asyncio.get_running_loop().run_in_executor(None, music_cache.recent_titles, AutocompleteConfig.MAX_TITLES)
+        for title, url in reversed(rows):
+            self.index.add(title, url)
+        logger.info(f"Autocomplete index seeded with {len(self.index)} titles")
+
+
+query_autocomplete = QueryAutocomplete()
@@ -2,6 +2,7 @@
 
 
 from enum import Enum
+import os
 import discord
 
 
@@ -10,6 +11,153 @@ FFMPEG_OPTIONS = {
     'options': '-vn'
 }
 
+
+class PlaybackMode:
+    AUTO = 'auto'  # Copy Opus sources as they are, decode anything else to PCM
+    OPUS = 'opus'  # Always hand Opus to discord.py, ffmpeg encodes non-Opus sources
+    PCM = 'pcm'  # Always decode to PCM and let discord.py encode every frame
+
+
+class AudioConfig:
+    PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', PlaybackMode.AUTO)
+
+
+class GaplessConfig:
+    ENABLED = os.getenv('GAPLESS', 'false').lower() in ('1', 'true')
+    CROSSFADE = float(os.getenv('CROSSFADE_SECONDS', '0'))  # Needs NumPy and decodes every track to PCM
+    PRESPAWN_SECONDS = 8  # Start the next track's ffmpeg this long before the current one ends
+    PREBUFFER_FRAMES = 25  # 20 ms frames read ahead from the next track before the hand-over
+    QUEUE_POLL_INTERVAL = 0.5  # Seconds between looks at an empty queue while a track is ending
+
+
+class MusicConfig:
+    MAX_QUEUE_LENGTH = 1000  # Tracks queued per guild
+    MAX_HISTORY_LENGTH = int(os.getenv('MUSIC_HISTORY_LENGTH', '100'))  # Played tracks remembered per guild
+    PLAYER_IDLE_TIMEOUT = 900  # Seconds before an idle guild player is evicted
+    REGISTRY_SWEEP_INTERVAL = 60  # Seconds between idle player sweeps
+    UI_REFRESH_INTERVAL = 5  # Seconds between now-playing updates
+    QUEUE_PAGE_SIZE = 10  # Tracks per /queue page, Discord allows 25 embed fields
+    QUEUE_VIEW_TIMEOUT = 120  # Seconds a paginated /queue message stays up
+    PREVIOUS_RESTART_SECONDS = 30  # Past this position /previous restarts the current track instead
+
+
+class VoiceConfig:
+    IDLE_TIMEOUT = float(os.getenv('VOICE_IDLE_TIMEOUT', '300'))  # Seconds connected with nothing queued before disconnecting
+    CONNECT_TIMEOUT = 15.0  # Seconds for one voice handshake
+    CONNECT_ATTEMPTS = 4  # Tries per connect before giving up
+    RETRY_DELAY = 1.0  # Seconds before the first retry, doubled per attempt
+    MAX_RETRY_DELAY = 15.0
+
+
+class EditConfig:
+    MIN_INTERVAL = 5  # Seconds between edits of messages in one channel
+    MAX_INTERVAL = 60  # Upper bound while backing off from rate limits
+    SLOW_EDIT_SECONDS = 1.5  # Edits slower than this most likely waited on a rate-limit bucket
+    REPORT_INTERVAL = 300  # Seconds between edit statistics log lines
+
+
+class ExpiryConfig:
+    BATCH_WINDOW = 1.0  # Seconds, temporary messages expiring this close together are deleted in one go
+    MAX_BULK_DELETE = 100  # Discord accepts at most 100 messages per bulk delete
+
+
+class JournalConfig:
+    ENABLED = os.getenv('QUEUE_JOURNAL', 'true').lower() in ('1', 'true')
+    DIRECTORY = os.getenv('QUEUE_JOURNAL_DIR', 'cache/journal')
+    COMPACT_EVERY = 500  # Journaled operations before a new snapshot is written
+    POSITION_INTERVAL = 15  # Seconds of playback between journaled positions
+
+
+class AutocompleteConfig:
+    MAX_CHOICES = 10  # Suggestions shown, Discord allows 25
+    MAX_TITLES = 5000  # Resolved titles kept in the prefix index
+    SEARCH_RESULTS = 5  # Entries fetched with ytsearchN for an unknown prefix
+    MIN_SEARCH_CHARS = 3  # Shorter input is answered from the index only
+    SEARCH_TTL = 600  # Seconds a prefix search result is reused
+    MAX_CACHED_SEARCHES = 2000
+    DEBOUNCE = 0.3  # Seconds to wait for the next keystroke before searching
+    BUDGET = 2.5  # Seconds an autocomplete answer may take, Discord gives up after 3
+
+
+class MetricsConfig:
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)  # Seconds
+    LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)  # Seconds
+    BACKLOG_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)  # Messages
+    GAP_BUCKETS = (0.001, 0.005, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)  # Seconds
+    LOOP_LAG_INTERVAL = 0.5  # Seconds between event loop lag samples
+
+
+class WatchdogConfig:
+    ENABLED = os.getenv('STALL_WATCHDOG', 'false').lower() in ('1', 'true', 'yes')
+    THRESHOLD = float(os.getenv('STALL_THRESHOLD_MS', '250')) / 1000  # Seconds of loop lag counted as a stall
+    INTERVAL = 0.05  # Seconds between heartbeats and between watchdog checks
+    MAX_SITES = 200  # Distinct call sites whose stack is kept
+    STACK_DEPTH = 12  # Innermost frames logged per stall
+
+
+class ApiConfig:
+    ENABLED = os.getenv('API_SERVER', 'true').lower() in ('1', 'true', 'yes')
+    HOST = os.getenv('API_HOST', '127.0.0.1')  # /metrics and /debug/stalls are for the host, set 0.0.0.0 to expose them
+    PORT = int(os.getenv('API_PORT', '5000'))
+    LOG_SAMPLE_RATE = 0.01  # Share of ordinary requests that are logged
+    SLOW_REQUEST_SECONDS = 0.5  # Slower requests and errors are always logged
+
+
+class ResolverConfig:
+    MAX_WORKERS = 4  # Concurrent yt-dlp extractions
+    TIMEOUT = 20.0  # Seconds a caller waits for one resolve
+    SOCKET_TIMEOUT = 10  # Seconds yt-dlp waits on a stalled connection
+    PLAYLIST_WORKERS = 2  # Concurrent playlist listings, kept apart from single resolves
+    PLAYLIST_BUFFER = 50  # Entries listed ahead of the queue
+    SEARCH_WORKERS = 2  # Concurrent autocomplete searches, kept apart from resolves
+
+
+class AudioCacheConfig:
+    ENABLED = os.getenv('AUDIO_CACHE', 'false').lower() in ('1', 'true')
+    DIRECTORY = os.getenv('AUDIO_CACHE_DIR', 'cache/audio')
+    MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024
+    MIN_PLAYS = 2  # Download a track the second time it is played
+    MAX_TRACK_SECONDS = 900  # Longer tracks (mixes, streams) are never cached
+    MAX_DOWNLOADS = 1  # Concurrent background downloads
+    MAX_TRACKED_PLAYS = 5000  # Uncached tracks whose play count is remembered
+    HALF_LIFE = 7 * 24 * 3600  # Seconds for a play to lose half its weight in eviction
+
+
+class LoudnessConfig:
+    ENABLED = os.getenv('LOUDNESS_NORMALIZE', 'false').lower() in ('1', 'true')  # Needs NumPy, decodes every new track a second time
+    DB_PATH = os.getenv('LOUDNESS_DB', 'cache/loudness.sqlite3')
+    MEMORY_ENTRIES = 2048  # Analyses kept in the in-memory LRU, the rest are read from SQLite
+    TARGET = -14.0  # Loudness every track is brought to, dB relative to full scale
+    MAX_BOOST = 10.0  # dB, quiet tracks are not raised further to avoid pumping up noise
+    MAX_CUT = 15.0  # dB
+    PEAK_CEILING = -1.0  # dBFS a boosted peak may reach
+    GAIN_TOLERANCE = 1.0  # dB, smaller corrections keep the Opus stream copy
+    SAMPLE_RATE = 22050  # Hz, mono PCM decoded for analysis
+    BLOCK_SECONDS = 0.1  # Blocks for silence detection, four make one 400 ms loudness window
+    SILENCE_THRESHOLD = -50.0  # dBFS, quieter blocks count as silence
+    MIN_TRIM = 1.0  # Seconds of silence before an intro or outro is trimmed
+    TRIM_PADDING = 0.2  # Seconds of silence kept on each side of the music
+    MAX_TRACK_SECONDS = 900  # Longer tracks (mixes, streams) are never analyzed
+    MAX_ANALYSES = 1  # Concurrent background analyses
+
+
+class MusicCacheConfig:
+    DB_PATH = os.getenv('MUSIC_CACHE_DB', 'cache/music_info.sqlite3')
+    MEMORY_ENTRIES = 512  # Tracks kept in the in-memory LRU
+    MAX_DISK_ENTRIES = 20000  # Tracks kept in SQLite, the least recently stored are pruned
+    PRUNE_EVERY = 500  # Writes between prunes of the SQLite store
+    METADATA_TTL = 30 * 24 * 3600  # Title, duration, channel, thumbnail rarely change
+    DEFAULT_URL_TTL = 1800  # Stream URLs without an expire= parameter
+    URL_SAFETY_MARGIN = 120  # Seconds of validity left after the track would finish
+
+
+class PrefetchConfig:
+    DEPTH = 2  # Upcoming tracks kept ready while the current one plays
+    REFRESH_HORIZON = 300  # Seconds a stream URL must stay valid after the track is expected to end
+    INTERVAL = 60  # Seconds between checks when the queue does not change
+    PROBE = False  # ffprobe codec and bitrate when yt-dlp did not report them
+
+
 class RunningEnvironment():
 	TESTING = 'test'
 	DEPLOY = 'deploy'
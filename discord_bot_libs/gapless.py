@@ -0,0 +1,186 @@
+import asyncio
+import importlib.util
+import math
+import threading
+from typing import Callable, Optional
+
+import discord
+from loguru import logger
+
+from discord_bot_libs.audio_source import FRAME_SECONDS, PlaybackSource
+from discord_bot_libs.constants import AudioConfig, GaplessConfig, PlaybackMode
+from discord_bot_libs.metrics import metrics
+
+
+def _crossfade_seconds() -> float:
+    if GaplessConfig.CROSSFADE > 0 and importlib.util.find_spec('numpy') is None:
+        logger.warning("NumPy is not installed, gapless playback runs without crossfade")
+        return 0.0
+    return GaplessConfig.CROSSFADE
+
+
+CROSSFADE_SECONDS = _crossfade_seconds()
+TRANSITIONS = metrics.counter('discord_bot_gapless_transitions_total', 'Tracks handed over inside one voice player, by whether they were crossfaded', ('crossfade',))
+
+
+class _NextTrack:
+    __slots__ = ('source', 'track', 'is_current')
+
+    def __init__(self, source: PlaybackSource, track, is_current: Callable[[], bool]):
+        self.source = source
+        self.track = track
+        self.is_current = is_current
+
+
+class GaplessSource(discord.AudioSource):
+    """Plays tracks back to back on one voice client player
+
+    The voice client plays this source from the first track until the queue runs out. Once
+    the current track is PRESPAWN_SECONDS from its end, on_near_end asks the loop for the
+    next one, whose ffmpeg is spawned and prebuffered while the current track still plays.
+    When the current track runs out, the read that sees its end already returns the first
+    frame of the next, and on_transition tells the loop which track is now playing. With a
+    crossfade the hand-over starts that many seconds early and the outgoing PCM is mixed
+    into the incoming one with equal-power gains.
+
+    Runs on the voice client's audio thread, only set_next is called from the loop.
+    """
+    def __init__(
+        self,
+        source: PlaybackSource,
+        loop: asyncio.AbstractEventLoop,
+        on_near_end: Callable[['GaplessSource'], None],
+        on_transition: Callable[[object], None],
+        prespawn: float = GaplessConfig.PRESPAWN_SECONDS,
+        crossfade: float = CROSSFADE_SECONDS,
+    ):
+        self.current = source
+        self.loop = loop
+        self.on_near_end = on_near_end
+        self.on_transition = on_transition
+        self.prespawn = prespawn
+        self.crossfade_frames = int(crossfade / FRAME_SECONDS) if crossfade > 0 and not source.is_opus() else 0
+        self._opus = source.is_opus()
+        self._lock = threading.Lock()
+        self._next: Optional[_NextTrack] = None
+        self._near_end_sent = False
+        self._closed = False
+        self._fading: Optional[PlaybackSource] = None
+        self._fade_step = 0
+
+    @property
+    def position(self) -> float:
+        return self.current.position
+
+    @property
+    def ended_at(self) -> Optional[float]:
+        return self.current.ended_at
+
+    @property
+    def gap_since(self) -> Optional[float]:
+        return self.current.gap_since
+
+    @gap_since.setter
+    def gap_since(self, value: Optional[float]):
+        self.current.gap_since = value
+
+    def needs_next(self, playing: PlaybackSource) -> bool:
+        """Whether a track should still be chained after playing, the loop polls this while the queue is empty"""
+        return not self._closed and self.current is playing and self._next is None
+
+    def set_next(self, source: PlaybackSource, track, is_current: Callable[[], bool]) -> bool:
+        """Queue the prebuffered next track, False when it can not be chained and must be cleaned up"""
+        with self._lock:
+            if self._closed or self._next is not None or source.is_opus() != self._opus:
+                return False
+            self._next = _NextTrack(source, track, is_current)
+            return True
+
+    def read(self) -> bytes:
+        if self.crossfade_frames and self._fading is None and self._next is not None:
+            remaining = self.current.remaining()
+            if remaining is not None and remaining <= self.crossfade_frames * FRAME_SECONDS:
+                self._hand_over(fade=True)
+
+        data = self.current.read()
+        if not self._near_end_sent:
+            remaining = self.current.remaining()
+            if remaining is not None and remaining <= self.prespawn:
+                self._near_end_sent = True
+                self.loop.call_soon_threadsafe(self.on_near_end, self)
+
+        if not data:
+            ended_at = self.current.ended_at
+            if not self._hand_over(fade=False):
+                return b''
+            self.current.gap_since = ended_at
+            data = self.current.read()
+
+        if self._fading is not None:
+            data = self._mix_fade(data)
+        return data
+
+    def _hand_over(self, fade: bool) -> bool:
+        with self._lock:
+            upcoming, self._next = self._next, None
+        if upcoming is None:
+            return False
+        if not upcoming.is_current():
+            # The queue changed after the next track was prepared, the loop picks the right one
+            upcoming.source.cleanup()
+            return False
+        if self._fading is not None:
+            self._fading.cleanup()
+        if fade:
+            self._fading = self.current
+            self._fade_step = 0
+        else:
+            self.current.cleanup()
+        self.current = upcoming.source
+        self._near_end_sent = False
+        TRANSITIONS.inc(1, 'true' if fade else 'false')
+        self.loop.call_soon_threadsafe(self.on_transition, upcoming.track)
+        return True
+
+    def _mix_fade(self, data: bytes) -> bytes:
+        import numpy as np
+        outgoing = self._fading.read()
+        if not outgoing or not data or len(outgoing) != len(data):
+            self._end_fade()
+            return data or outgoing
+        samples = len(data) // 4  # Stereo 16-bit frames
+        ramp = (self._fade_step + np.arange(samples, dtype=np.float32) / samples) / self.crossfade_frames
+        fade_in = np.repeat(np.sin(ramp * (math.pi / 2)), 2)
+        fade_out = np.repeat(np.cos(ramp * (math.pi / 2)), 2)
+        mixed = np.frombuffer(data, dtype='<i2') * fade_in + np.frombuffer(outgoing, dtype='<i2') * fade_out
+        self._fade_step += 1
+        if self._fade_step >= self.crossfade_frames:
+            self._end_fade()
+        return np.clip(mixed, -32768, 32767).astype('<i2').tobytes()
+
+    def _end_fade(self):
+        self._fading.cleanup()
+        self._fading = None
+
+    def is_opus(self) -> bool:
+        return self._opus
+
+    def cleanup(self):
+        with self._lock:
+            self._closed = True
+            upcoming, self._next = self._next, None
+        if upcoming is not None:
+            upcoming.source.cleanup()
+        if self._fading is not None:
+            self._end_fade()
+        self.current.cleanup()
+
+
+def playback_mode() -> str:
+    """Every track of a chain must be Opus or every one PCM, a crossfade mixes PCM"""
+    if GaplessConfig.ENABLED:
+        if CROSSFADE_SECONDS:
+            return PlaybackMode.PCM
+        if AudioConfig.PLAYBACK_MODE == PlaybackMode.AUTO:
+            return PlaybackMode.OPUS
+    return AudioConfig.PLAYBACK_MODE
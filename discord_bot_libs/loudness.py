@@ -0,0 +1,267 @@
+import asyncio
+import importlib.util
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional
+
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.audio_cache import SAFE_ID_PATTERN
+from discord_bot_libs.constants import FFMPEG_OPTIONS, LoudnessConfig
+from discord_bot_libs.metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+WINDOW_BLOCKS = 4  # 400 ms loudness windows overlapping by 75%, as in ITU-R BS.1770
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU below the ungated loudness
+CHUNK_SECONDS = 10  # PCM read and measured at a time
+SILENT_POWER = 1e-12
+
+ANALYSIS_SECONDS = metrics.histogram('discord_bot_loudness_analysis_seconds', 'Time to decode and measure one track for loudness and silence')
+
+
+class TrackAnalysis:
+    """Static corrections for one track: a gain in dB and the span between its silent intro and outro"""
+    __slots__ = ('loudness', 'peak', 'gain', 'start', 'end')
+
+    def __init__(self, loudness: float, peak: float, gain: float, start: float, end: Optional[float]):
+        self.loudness = loudness
+        self.peak = peak
+        self.gain = gain
+        self.start = start
+        self.end = end
+
+    def needs_gain(self) -> bool:
+        return abs(self.gain) >= LoudnessConfig.GAIN_TOLERANCE
+
+
+def block_powers(samples: 'np.ndarray', block: int) -> 'np.ndarray':
+    """Mean square of every whole block of samples"""
+    import numpy as np
+    blocks = samples[:len(samples) - len(samples) % block].reshape(-1, block)
+    return np.einsum('ij,ij->i', blocks, blocks) / block
+
+
+def measure(powers: 'np.ndarray', peak: float, block_seconds: float = LoudnessConfig.BLOCK_SECONDS) -> Optional[TrackAnalysis]:
+    """Gated integrated loudness and silence bounds from per-block powers
+
+    Follows the BS.1770 gating without its K-weighting filter, so the loudness is in
+    LUFS-like units of the unweighted signal. Returns None for a silent track.
+    """
+    import numpy as np
+    if len(powers) >= WINDOW_BLOCKS:
+        windows = np.convolve(powers, np.full(WINDOW_BLOCKS, 1 / WINDOW_BLOCKS), mode='valid')
+    else:
+        windows = powers
+    levels = -0.691 + 10 * np.log10(windows + SILENT_POWER)
+    windows = windows[levels > ABSOLUTE_GATE]
+    if not windows.size:
+        return None
+    levels = levels[levels > ABSOLUTE_GATE]
+    relative_gate = -0.691 + 10 * np.log10(windows.mean()) + RELATIVE_GATE
+    loudness = float(-0.691 + 10 * np.log10(windows[levels > relative_gate].mean()))
+
+    peak_db = 20 * np.log10(max(peak, SILENT_POWER))
+    gain = min(max(LoudnessConfig.TARGET - loudness, -LoudnessConfig.MAX_CUT), LoudnessConfig.MAX_BOOST)
+    gain = min(gain, max(0.0, LoudnessConfig.PEAK_CEILING - peak_db))
+
+    audible = np.flatnonzero(10 * np.log10(powers + SILENT_POWER) > LoudnessConfig.SILENCE_THRESHOLD)
+    if not audible.size:
+        return TrackAnalysis(loudness, float(peak_db), float(gain), 0.0, None)
+    music_start = audible[0] * block_seconds
+    music_end = (audible[-1] + 1) * block_seconds
+    total = len(powers) * block_seconds
+    start = max(0.0, music_start - LoudnessConfig.TRIM_PADDING) if music_start >= LoudnessConfig.MIN_TRIM else 0.0
+    end = music_end + LoudnessConfig.TRIM_PADDING if total - music_end >= LoudnessConfig.MIN_TRIM else None
+    return TrackAnalysis(loudness, float(peak_db), float(gain), float(start), end and float(end))
+
+
+class LoudnessIndex:
+    """Per-video loudness and silence analysis, measured once in the background and kept in SQLite
+
+    A track is analyzed the first time it is queued or played by decoding it to mono PCM
+    and measuring it with NumPy. Later plays apply the stored gain and trim as static
+    ffmpeg options instead of an adaptive filter such as loudnorm. The database is opened
+    on first use and only the most recently used analyses are kept in memory.
+    """
+    def __init__(self, path: str = LoudnessConfig.DB_PATH, enabled: bool = LoudnessConfig.ENABLED, memory_entries: int = LoudnessConfig.MEMORY_ENTRIES):
+        self.enabled = enabled and self._numpy_available()
+        self.memory_entries = memory_entries
+        self.analyzed = 0
+        self.failed = 0
+        self._path = path
+        self._entries: OrderedDict[str, TrackAnalysis] = OrderedDict()
+        self._pending: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_opened = False
+
+    @staticmethod
+    def _numpy_available() -> bool:
+        if importlib.util.find_spec('numpy') is None:
+            logger.warning("NumPy is not installed, loudness normalization is disabled")
+            return False
+        return True
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self._db_opened:
+            self._db_opened = True
+            self._db = self._open_db(self._path)
+        return self._db
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS loudness (video_id TEXT PRIMARY KEY, loudness REAL, peak REAL, gain REAL, start REAL, end REAL, analyzed_at REAL NOT NULL)')
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            logger.error(f"Loudness index running memory-only, failed to open {path}: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, music_info: MusicInfo) -> Optional[TrackAnalysis]:
+        if not self.enabled or not music_info.video_id:
+            return None
+        return self._lookup(music_info.video_id)
+
+    def _lookup(self, video_id: str) -> Optional[TrackAnalysis]:
+        analysis = self._entries.get(video_id)
+        if analysis is not None:
+            self._entries.move_to_end(video_id)
+            return analysis
+        db = self._connection()
+        if db is None:
+            return None
+        try:
+            # A primary key lookup, cheap enough for the event loop
+            row = db.execute('SELECT loudness, peak, gain, start, end FROM loudness WHERE video_id = ?', (video_id,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Loudness index read failed: {e}")
+            return None
+        if row is None:
+            return None
+        analysis = TrackAnalysis(*row)
+        self._remember(video_id, analysis)
+        return analysis
+
+    def _remember(self, video_id: str, analysis: TrackAnalysis):
+        self._entries[video_id] = analysis
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.memory_entries:
+            self._entries.popitem(last=False)
+
+    def request(self, music_info: MusicInfo, local_path: Optional[str] = None):
+        """Analyze the track in the background unless it is known, returns immediately"""
+        if not self._should_analyze(music_info, local_path):
+            return
+        self._pending.add(music_info.video_id)
+        task = asyncio.create_task(self._analyze(music_info, local_path or music_info.url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _should_analyze(self, music_info: MusicInfo, local_path: Optional[str]) -> bool:
+        video_id = music_info.video_id
+        return (
+            self.enabled
+            and bool(video_id)
+            and SAFE_ID_PATTERN.fullmatch(video_id) is not None
+            and video_id not in self._pending
+            and bool(local_path or music_info.url)
+            and 0 < music_info.duration <= LoudnessConfig.MAX_TRACK_SECONDS
+            and self._lookup(video_id) is None
+        )
+
+    async def _analyze(self, music_info: MusicInfo, source: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(LoudnessConfig.MAX_ANALYSES)
+        try:
+            async with self._semaphore:
+                start_time = time.perf_counter()
+                analysis = await self._decode_and_measure(source)
+                ANALYSIS_SECONDS.observe(time.perf_counter() - start_time)
+            if analysis is None:
+                self.failed += 1
+                return
+            self._store(music_info.video_id, analysis)
+            self.analyzed += 1
+            logger.info(
+                f"Analyzed {music_info.title}: {analysis.loudness:.1f} LUFS, gain {analysis.gain:+.1f} dB, "
+                f"music {analysis.start:.1f}s to {f'{analysis.end:.1f}s' if analysis.end else 'end'}"
+            )
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error analyzing loudness of {music_info.title}: {e}")
+        finally:
+            self._pending.discard(music_info.video_id)
+
+    async def _decode_and_measure(self, source: str) -> Optional[TrackAnalysis]:
+        import numpy as np
+        rate = LoudnessConfig.SAMPLE_RATE
+        block = int(rate * LoudnessConfig.BLOCK_SECONDS)
+        block_bytes = block * 2
+        before_options = [] if os.path.exists(source) else FFMPEG_OPTIONS['before_options'].split()
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', *before_options, '-i', source, '-vn', '-ac', '1', '-ar', str(rate),
+            '-f', 's16le', '-loglevel', 'error', 'pipe:1',
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        powers: List[np.ndarray] = []
+        peak = 0.0
+        leftover = b''
+        try:
+            while True:
+                data = await process.stdout.read(CHUNK_SECONDS * rate * 2)
+                if not data:
+                    break
+                data = leftover + data
+                usable = len(data) - len(data) % block_bytes
+                leftover = data[usable:]
+                if not usable:
+                    continue
+                samples = np.frombuffer(data, dtype='<i2', count=usable // 2).astype(np.float32) / 32768
+                peak = max(peak, float(np.abs(samples).max()))
+                powers.append(block_powers(samples, block))
+        except BaseException:
+            process.kill()
+            await process.wait()
+            raise
+        stderr = await process.stderr.read()
+        await process.wait()
+        if process.returncode != 0 or not powers:
+            logger.warning(f"Loudness analysis decode failed: {stderr.decode(errors='ignore').strip()}")
+            return None
+        return measure(np.concatenate(powers), peak)
+
+    def _store(self, video_id: str, analysis: TrackAnalysis):
+        self._remember(video_id, analysis)
+        db = self._connection()
+        if db is None:
+            return
+        try:
+            db.execute(
+                'INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (video_id, analysis.loudness, analysis.peak, analysis.gain, analysis.start, analysis.end, time.time()),
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to store loudness of {video_id}: {e}")
+
+
+loudness_index = LoudnessIndex()
+metrics.gauge('discord_bot_loudness_tracks', 'Loudness and silence analyses held in memory', callback=loudness_index.__len__)
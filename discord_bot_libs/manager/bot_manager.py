@@ -3,8 +3,6 @@
 import asyncio
 import discord
 from loguru import logger
-from pydub import AudioSegment
-from pydub.playback import play
 
 
 async def on_message(message):
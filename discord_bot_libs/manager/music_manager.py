@@ -1,68 +1,117 @@
-from concurrent.futures import ThreadPoolExecutor
-import threading
 import time
 import discord
 import asyncio
+from contextlib import aclosing
 from loguru import logger
-from typing import Optional
-
-from discord_bot_api.model.music_model import MusicInfo, MusicState, RequestInfo, map_request_info
-from discord_bot_libs.constants import FFMPEG_OPTIONS
-from discord_bot_libs.ui.music_ui import MusicControlButtons, MusicEmbed
+from typing import List, Optional, Union
+
+from discord_bot_api.model.music_model import MusicInfo, MusicState, RequestInfo, map_request_info, track_key
+from discord_bot_libs.audio_cache import audio_cache
+from discord_bot_libs.autocomplete import query_autocomplete
+from discord_bot_libs.audio_source import PlaybackSource, create_audio_source, prebuffer
+from discord_bot_libs.loudness import loudness_index
+from discord_bot_libs.constants import GaplessConfig, JournalConfig, MusicConfig
+from discord_bot_libs.gapless import GaplessSource, playback_mode
+from discord_bot_libs.metrics import metrics
+from discord_bot_libs.prefetcher import TrackPrefetcher
+from discord_bot_libs.queue_journal import QueueJournal
+from discord_bot_libs.resolver import is_playlist, resolver
+from discord_bot_libs.ui.edit_scheduler import edit_scheduler
+from discord_bot_libs.ui.music_ui import MusicControlButtons, MusicEmbed, MusicQueueView, QueuePages, UIHelper
 from discord_bot_libs.utils import get_music_info, send_temp_embed, send_temp_noti
+from discord_bot_libs.voice_session import VoiceSession
 
 
 
 class AudioPlayer:
+    """Plays one source at a time and reports its end through the voice client's after= callback
+
+    The position comes from the frames the source has delivered, so it holds still while
+    paused and follows seeks.
+    """
     def __init__(self, voice_client: discord.VoiceClient):
-        self.time_played = 0
         self.voice_client = voice_client
-        self._initialize_thread_pool()
-
-    def _initialize_thread_pool(self):
-        if hasattr(self, 'player_thread_pool'):
-            self.player_thread_pool.shutdown(wait=False)
-        if hasattr(self, 'current_player_task') and self.current_player_task:
-            self.current_player_task.cancel()
-            self.current_player_task = None
-        self.player_thread_pool = ThreadPoolExecutor(max_workers=1)
-
-    async def play(self, audio_source, on_play_callback, on_finish_callback):
-        self._initialize_thread_pool()
-        self.current_player_task = self.player_thread_pool.submit(
-            self._play_in_thread, 
-            audio_source, 
-            on_play_callback,
-            on_finish_callback
-        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._generation = 0
+        self._source: Optional[Union[PlaybackSource, GaplessSource]] = None
+        self.last_ended_at: Optional[float] = None  # When the last track ran out, for the gap to the next one
+        self.last_position = 0.0  # Where the last source stopped, to resume it after a lost connection
+
+    async def play(self, audio_source: Union[PlaybackSource, GaplessSource], on_finish_callback):
+        self._loop = asyncio.get_running_loop()
+        self._generation += 1
+        generation = self._generation
+        audio_source.gap_since, self.last_ended_at = self.last_ended_at, None
+
+        def after(error):
+            # Runs on the voice client's audio thread
+            self._loop.call_soon_threadsafe(self._on_finish, generation, error, on_finish_callback)
+
+        self.voice_client.play(audio_source, after=after)
+        self._source = audio_source
+
+    async def replace(self, audio_source: Union[PlaybackSource, GaplessSource], on_finish_callback):
+        """Swap the playing source for another one, the stopped source does not report an end"""
+        paused = self.is_paused()
+        self._generation += 1
+        self.voice_client.stop()
+        await self.play(audio_source, on_finish_callback)
+        if paused:
+            self.pause()
+
+    def _on_finish(self, generation: int, error: Optional[Exception], on_finish_callback):
+        if generation != self._generation:
+            return
+        self.last_ended_at = self._source.ended_at if self._source else None
+        self.last_position = self._source.position if self._source else 0.0
+        self._source = None
+        on_finish_callback(error)
 
-    def _play_in_thread(self, audio_source, on_play_callback, on_finish_callback):
-        start_time = time.time()
-        try:
-            self.voice_client.play(audio_source)
-            while (self.voice_client and (self.voice_client.is_playing() or self.voice_client.is_paused())):
-                if self.voice_client.is_playing():
-                    self.time_played = int(time.time() - start_time)
-                    on_play_callback(self.time_played)
-                threading.Event().wait(5)
-            on_finish_callback(None)
-        except Exception as e:
-            logger.error(f"Error in player thread: {e}")
-            on_finish_callback(e)
+    def pause(self):
+        if self.voice_client.is_playing():
+            self.voice_client.pause()
+
+    def resume(self):
+        if self.voice_client.is_paused():
+            self.voice_client.resume()
+
+    def is_playing(self) -> bool:
+        return self._source is not None and self.voice_client.is_playing()
+
+    def is_paused(self) -> bool:
+        return self._source is not None and self.voice_client.is_paused()
+
+    @property
+    def position(self) -> float:
+        return self._source.position if self._source else 0.0
+
+    @property
+    def time_played(self) -> int:
+        return int(self.position)
 
     async def get_time_played(self):
         return self.time_played
-    
 
-    
+
 class MusicPlayer:
-    def __init__(self):
+    def __init__(self, guild_id: Optional[int] = None):
+        self.guild_id = guild_id
+        self.last_active = time.monotonic()
         self.music_state = MusicState()
         self.music_embed = MusicEmbed()
+        self.queue_pages = QueuePages(self.music_state)
+        self.prefetcher = TrackPrefetcher(self.music_state)
         self.audio_player = None
-        self.voice_client = None
+        self.voice_session = VoiceSession(guild_id)
         self.last_interaction = None
+        self.playing_interaction = None
         self.current_message = None
+        self._ui_update: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def voice_client(self) -> Optional[discord.VoiceClient]:
+        return self.voice_session.voice_client
 
     @staticmethod
     def set_interaction_wrapper():
@@ -76,6 +125,7 @@ class MusicPlayer:
                 )
                 if interaction:
                     self.last_interaction = interaction
+                self.last_active = time.monotonic()
                 return await func(self, *args, **kwargs)
             return wrapper
         return decorator
@@ -83,18 +133,51 @@ class MusicPlayer:
     @set_interaction_wrapper()
     async def play(self, interaction: discord.Interaction, query: str):
         """Handle play command"""
+        if is_playlist(query):
+            await self._play_playlist(interaction, query)
+            return
+
         music_info = await self._fetch_music_info(query)
         if not music_info:
             return
 
+        query_autocomplete.remember(music_info)
         request_info = map_request_info(music_info, interaction.user)
         position = self.music_state.add_track(request_info)
+        if position is None:
+            await send_temp_noti(interaction, "❌ The queue is full!")
+            return
         description = f"⏱️ {music_info._duration()} {' '*25} \t \t 📍 Position: {position}"
         logger.info(f"🎵 Added to queue: {music_info.title}")
         await send_temp_noti(interaction, f"➕ {music_info.title}", description, music_info.webpage_url)
 
         if not self.music_state.is_playing:
             await self._play_next(interaction)
+        else:
+            self.prefetcher.poke()
+
+    async def _play_playlist(self, interaction: discord.Interaction, url: str):
+        """Queue playlist entries as they are listed, each one is resolved just before it plays"""
+        if not interaction.user.voice:
+            await send_temp_noti(interaction, "NOTI", "❌ You are not in a voice channel!")
+            return
+
+        added = 0
+        limit = self.music_state.max_queue_length - self.music_state.queue_length()
+        async with aclosing(resolver.iter_playlist(url, limit)) as entries:
+            async for music_info in entries:
+                if self.music_state.add_track(map_request_info(music_info, interaction.user)) is None:
+                    break
+                added += 1
+                if not self.music_state.is_playing:
+                    await self._play_next(interaction)
+
+        if not added:
+            await send_temp_noti(interaction, 'Play', f"❌ No music found for: {url}")
+            return
+        logger.info(f"🎵 Added {added} tracks from playlist: {url}")
+        self.prefetcher.poke()
+        await send_temp_noti(interaction, f"➕ Added {added} tracks", url=url)
 
     @set_interaction_wrapper()
     async def _play_next(self, interaction: discord.Interaction):
@@ -104,10 +187,20 @@ class MusicPlayer:
             return
         request_info = self.music_state.next_track()
         if not request_info:
-            await send_temp_noti(interaction, "🎵 No more songs in the queue!")
+            if self.audio_player:
+                self.audio_player.last_ended_at = None
             self.music_state.is_playing = False
+            self.voice_session.idle()
+            await send_temp_noti(interaction, "🎵 No more songs in the queue!")
+            return
+        # Taken before the awaits below, so a command racing this one queues behind it
+        self.music_state.is_playing = True
+        if not await self.prefetcher.prepare(request_info):
+            await send_temp_noti(interaction, "❌ Can not play", request_info.music_info.title)
+            await self._play_next(interaction)
             return
         await self._play_music(interaction, request_info)
+        self.prefetcher.poke()
         
     
     @set_interaction_wrapper()
@@ -121,33 +214,114 @@ class MusicPlayer:
 
     @set_interaction_wrapper()
     async def previous(self, interaction: discord.Interaction):
-        """Handle previous command"""
+        """Restart the current track once it is past PREVIOUS_RESTART_SECONDS, otherwise go back one"""
         logger.info("Previous command")
+        if self.audio_player and self.audio_player.time_played > MusicConfig.PREVIOUS_RESTART_SECONDS:
+            if await self._seek_to(0):
+                return
+        current_track = self.music_state.remove_previous_track()
+        if not current_track:
+            await send_temp_noti(interaction, "❌ Dont have previous track!")
+            return
+        if self.music_state.current_track and track_key(self.music_state.current_track) == track_key(current_track):
+            current_track = self.music_state.current_track  # History keeps compacted tracks, this one still has its stream URL
         previous_track = self.music_state.remove_previous_track()
         if previous_track:
-            time_played = await self.audio_player.get_time_played()
-            if time_played <= 30 and len(self.music_state.get_history()) > 0:
-                previous_track = self.music_state.remove_previous_track()
+            # The current track plays again after the previous one, like going back in a playlist
+            self.music_state.add_track(current_track, 0)
+            self.music_state.add_track(previous_track, 0)
+        else:
+            self.music_state.add_track(current_track, 0)
+        await self._play_next(interaction)
 
-            self.music_state.add_track(previous_track)
-            await self._play_next(interaction)
+    @set_interaction_wrapper()
+    async def seek(self, interaction: discord.Interaction, position: str):
+        """Jump within the current track, position is seconds or m:ss"""
+        seconds = UIHelper.parse_time(position)
+        request_info = self.music_state.current_track
+        if not self.audio_player or not request_info or not (self.audio_player.is_playing() or self.audio_player.is_paused()):
+            await send_temp_noti(interaction, "❌ Nothing is playing!")
+            return
+        analysis = loudness_index.get(request_info.music_info)
+        # Past a trimmed outro ffmpeg would be told to play nothing and the track would just end
+        end = int(analysis.end) if analysis and analysis.end else request_info.music_info.duration
+        if seconds is None or seconds >= end:
+            await send_temp_noti(interaction, "❌ Invalid position!", f"The track is {UIHelper.convert_seconds_to_time(end)} long")
+            return
+        if await self._seek_to(seconds):
+            await send_temp_noti(interaction, f"⏩ {UIHelper.convert_seconds_to_time(seconds)}", request_info.music_info.title)
         else:
-            await send_temp_noti(interaction, "❌ Dont have previous track!")
+            await send_temp_noti(interaction, "❌ Can not seek", request_info.music_info.title)
+
+    async def _seek_to(self, seconds: int) -> bool:
+        """Restart ffmpeg at a position of the current track from its cached stream URL or file"""
+        request_info = self.music_state.current_track
+        if not request_info or not self.playing_interaction or not self.audio_player:
+            return False
+        try:
+            audio_source = await self._create_source(request_info, seconds, record_play=False)
+        except Exception as e:
+            logger.error(f"Error seeking in {request_info.music_info.title}: {e}")
+            return False
+        await self._start_playback(self.playing_interaction, audio_source, replace=True)
+        self.music_state.record_position(seconds)
+        self.refresh_ui()
+        return True
 
     @set_interaction_wrapper()
     async def queue(self, interaction: discord.Interaction):
         """Handle queue command"""
-        queue = self.music_state.get_queue()
-        if not queue:
+        if not self.music_state.queue_length():
             await send_temp_noti(interaction, "🎵 The queue is null!")
             return
 
-        embed = await self.music_embed.create_queue(queue)
-        await send_temp_embed(interaction, embed)
+        embed = await self.queue_pages.render(0)
+        if self.queue_pages.page_count() > 1:
+            view = MusicQueueView(self.queue_pages)
+            await send_temp_embed(interaction, embed, delete_after=MusicConfig.QUEUE_VIEW_TIMEOUT, view=view)
+        else:
+            await send_temp_embed(interaction, embed)
     
+    @set_interaction_wrapper()
+    async def move(self, interaction: discord.Interaction, source: int, destination: int):
+        """Move a queued track, positions start at 1 as shown by /queue"""
+        track = self.music_state.move_track(source - 1, destination - 1)
+        if not track:
+            await send_temp_noti(interaction, "❌ Invalid position!", f"The queue has {self.music_state.queue_length()} tracks")
+            return
+        await send_temp_noti(interaction, f"↕️ {track.music_info.title}", f"📍 Position: {destination}")
+        self.prefetcher.poke()
+
+    @set_interaction_wrapper()
+    async def remove(self, interaction: discord.Interaction, position: int):
+        """Remove a queued track, positions start at 1 as shown by /queue"""
+        track = self.music_state.remove_track(position - 1)
+        if not track:
+            await send_temp_noti(interaction, "❌ Invalid position!", f"The queue has {self.music_state.queue_length()} tracks")
+            return
+        await send_temp_noti(interaction, f"➖ {track.music_info.title}")
+        self.prefetcher.poke()
+
+    @set_interaction_wrapper()
+    async def shuffle(self, interaction: discord.Interaction):
+        if not self.music_state.queue_length():
+            await send_temp_noti(interaction, "🎵 The queue is null!")
+            return
+        self.music_state.shuffle_queue()
+        await send_temp_noti(interaction, f"🔀 Shuffled {self.music_state.queue_length()} tracks")
+        self.prefetcher.poke()
+
+    @set_interaction_wrapper()
+    async def dedupe(self, interaction: discord.Interaction):
+        removed = self.music_state.dedupe_queue()
+        await send_temp_noti(interaction, f"🧹 Removed {removed} duplicate tracks")
+        if removed:
+            self.prefetcher.poke()
+
     @set_interaction_wrapper()
     async def _play_music(self, interaction: discord.Interaction, request_info: RequestInfo):
         if not await self._ensure_voice_client(interaction):
+            self.music_state.is_playing = False
             return
 
         self.music_state.is_playing = True
@@ -155,30 +329,125 @@ class MusicPlayer:
         logger.info(f"🎧 Channel: {interaction.user.voice.channel.name}")
         logger.info(f"👤 Requested by: {interaction.user.display_name}")
 
-        if not self.audio_player:
+        if not self.audio_player or self.audio_player.voice_client is not self.voice_client:
             self.audio_player = AudioPlayer(self.voice_client)
 
-        audio_source = discord.FFmpegPCMAudio(
-            request_info.music_info.url,
-            **FFMPEG_OPTIONS
-        )
-
-        def on_play(time_played):
-            asyncio.run_coroutine_threadsafe(
-                self._update_player_ui(interaction, request_info, time_played),
-                self.last_interaction.client.loop
-            )
+        start = self.music_state.take_resume_position(request_info)
+        audio_source = await self._create_source(request_info, start)
+        self.playing_interaction = interaction
+        await self._start_playback(interaction, audio_source)
+        self.refresh_ui()
+
+    async def _start_playback(self, interaction: discord.Interaction, audio_source: PlaybackSource, replace: bool = False):
+        """Hand a source to the audio player, in gapless mode wrapped so later tracks chain onto it"""
+        if GaplessConfig.ENABLED:
+            audio_source = GaplessSource(audio_source, asyncio.get_running_loop(), self._prepare_next_track, self._on_gapless_transition)
+        if replace:
+            await self.audio_player.replace(audio_source, self._on_finish_callback(interaction))
+        else:
+            await self.audio_player.play(audio_source, self._on_finish_callback(interaction))
+
+    def _prepare_next_track(self, chain: GaplessSource):
+        """Called from the loop when the playing track is about to end"""
+        self._spawn(self._prespawn_next(chain))
+
+    async def _prespawn_next(self, chain: GaplessSource):
+        """Spawn and prebuffer the next track's ffmpeg while the current one still plays"""
+        playing = chain.current
+        upcoming = self.music_state.get_queue_slice(0, 1)
+        while not upcoming:
+            # A track queued before this one ends still starts without a gap
+            await asyncio.sleep(GaplessConfig.QUEUE_POLL_INTERVAL)
+            if not chain.needs_next(playing):
+                return
+            upcoming = self.music_state.get_queue_slice(0, 1)
+        head_version = self.music_state.head_version
+        request_info = upcoming[0]
+        try:
+            if not await self.prefetcher.prepare(request_info):
+                return
+            # The play is counted on the hand-over, this source may still be thrown away
+            audio_source = await self._create_source(request_info, record_play=False)
+            await asyncio.to_thread(prebuffer, audio_source, GaplessConfig.PREBUFFER_FRAMES)
+        except Exception as e:
+            logger.error(f"Error preparing {request_info.music_info.title} for a gapless start: {e}")
+            return
 
+        def is_current() -> bool:
+            # Read on the audio thread, other queue changes do not matter to the hand-over
+            return self.music_state.head_version == head_version
+
+        if not is_current() or not chain.set_next(audio_source, request_info, is_current):
+            audio_source.cleanup()
+
+    def _on_gapless_transition(self, request_info: RequestInfo):
+        audio_cache.record_play(request_info.music_info)
+        self.music_state.advance_to(request_info)
+        logger.info(f"🎵 Start playing: {request_info.music_info.title}, without a gap")
+        self.refresh_ui()
+        self.prefetcher.poke()
+
+    async def _create_source(self, request_info: RequestInfo, start: float = 0, record_play: bool = True) -> PlaybackSource:
+        music_info = request_info.music_info
+        local_path = audio_cache.record_play(music_info) if record_play else audio_cache.local_path(music_info)
+        analysis = loudness_index.get(music_info)
+        if analysis is None:
+            loudness_index.request(music_info, local_path)
+        return await create_audio_source(music_info, playback_mode(), local_path=local_path, analysis=analysis, start=start)
+
+    def _on_finish_callback(self, interaction: discord.Interaction):
         def on_finish(error):
-            logger.info(f"🎵 Finished playing: {request_info.music_info.title}")
+            if self.music_state.current_track:
+                logger.info(f"🎵 Finished playing: {self.music_state.current_track.music_info.title}")
             if error:
                 logger.error(f"Error playing audio: {error}")
-            asyncio.run_coroutine_threadsafe(
-                self._play_next(interaction),
-                self.last_interaction.client.loop
-            )
-
-        await self.audio_player.play(audio_source, on_play, on_finish)
+            if self.voice_session.is_lost():
+                if self.voice_session.is_kicked():
+                    self._spawn(self._on_kicked(interaction))
+                elif self.music_state.current_track:
+                    self._spawn(self._recover(interaction, self.audio_player.last_position))
+                else:
+                    self._spawn(self._play_next(interaction))
+                return
+            self._spawn(self._play_next(interaction))
+        return on_finish
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run coro in the background, holding the task until it is done and logging its failure"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.opt(exception=task.exception()).error(f"Music player task failed in guild {self.guild_id}")
+
+    async def _on_kicked(self, interaction: discord.Interaction):
+        """A moderator disconnected the bot or its channel is gone, stop and keep the queue for the next /play"""
+        self.voice_session.forget()
+        self.audio_player = None
+        self.music_state.is_playing = False
+        self.music_state.stop()
+        await send_temp_noti(interaction, "👋 Disconnected from the voice channel")
+
+    async def _recover(self, interaction: discord.Interaction, position: float):
+        """Rejoin after the voice connection dropped and carry on where the current track stopped"""
+        request_info = self.music_state.current_track
+        if not await self.voice_session.reconnect():
+            self.music_state.is_playing = False
+            await send_temp_noti(interaction, "❌ Lost the voice connection", request_info.music_info.title)
+            return
+        self.audio_player = AudioPlayer(self.voice_client)
+        try:
+            audio_source = await self._create_source(request_info, position, record_play=False)
+        except Exception as e:
+            logger.error(f"Error resuming {request_info.music_info.title} after reconnecting: {e}")
+            await self._play_next(interaction)
+            return
+        await self._start_playback(interaction, audio_source)
+        self.refresh_ui()
 
     async def _fetch_music_info(self, query: str) -> Optional[MusicInfo]:
         music_info = await get_music_info(query)
@@ -194,47 +463,191 @@ class MusicPlayer:
             await send_temp_noti(interaction, "NOTI", "❌ You are not in a voice channel!")
             return False
 
-        voice_channel = interaction.user.voice.channel
-        if not self.voice_client:
-            self.voice_client = await voice_channel.connect()
-        elif self.voice_client.channel != voice_channel:
-            await self.voice_client.move_to(voice_channel)
+        if not await self.voice_session.connect(interaction.user.voice.channel):
+            await send_temp_noti(interaction, "NOTI", "❌ Can not join your voice channel, try again later!")
+            return False
         return True
     
     async def _update_player_ui(self, interaction, request_info, time_played=0):
         """Update music player UI"""
         embed = await self.music_embed.create_now_playing(request_info, time_played)
         view = MusicControlButtons(self.voice_client, self)
-        
+
         if self.current_message:
-            try:
-                await self.current_message.edit(embed=embed, view=view)
-            except discord.errors.NotFound:
-                # Message không còn tồn tại, gửi message mới
-                message = await interaction.followup.send(embed=embed, view=view)
-                self.current_message = message
-            except discord.errors.HTTPException as e:
-                logger.error(f"HTTPException when editing message: {e}")
-                # Gửi message mới nếu có lỗi HTTP
-                message = await interaction.followup.send(embed=embed, view=view)
-                self.current_message = message
+            edit_scheduler.submit(
+                self.current_message, embed, view,
+                fallback=lambda: self._send_player_ui(interaction, embed, view)
+            )
         else:
-            message = await interaction.followup.send(embed=embed, view=view)
-            self.current_message = message
-    
+            await self._send_player_ui(interaction, embed, view)
+
+    async def _send_player_ui(self, interaction, embed, view):
+        """Send a new player message when there is none or the old one can not be edited"""
+        self.current_message = await interaction.followup.send(embed=embed, view=view, wait=True)
+
+    def refresh_ui(self):
+        """Schedule a now-playing update unless the previous one is still in flight"""
+        request_info = self.music_state.current_track
+        if not request_info or not self.playing_interaction or not self.audio_player:
+            return
+        if self._ui_update and not self._ui_update.done():
+            return
+        self._ui_update = asyncio.create_task(
+            self._update_player_ui(self.playing_interaction, request_info, self.audio_player.time_played)
+        )
+
+    def toggle_pause(self) -> bool:
+        """Pause or resume playback, returns True when paused"""
+        if not self.audio_player:
+            return False
+        if self.audio_player.is_paused():
+            self.audio_player.resume()
+            return False
+        self.audio_player.pause()
+        return self.audio_player.is_paused()
+
+    def is_idle(self, now: float, timeout: float) -> bool:
+        if self.music_state.is_playing:
+            return False
+        if self.voice_client and (self.voice_client.is_playing() or self.voice_client.is_paused()):
+            return False
+        return now - self.last_active > timeout
+
+    async def close(self):
+        """Release the voice connection and the in-memory queue, the journal keeps it on disk"""
+        self.prefetcher.stop()
+        for task in list(self._tasks):
+            task.cancel()
+        self.music_state.stop()
+        self.music_state.detach_journal()
+        self.music_state.clear_queue()
+        self.music_state.clear_history()
+        await self.voice_session.close()
+        self.audio_player = None
+        if self.current_message:
+            edit_scheduler.forget(self.current_message)
+        self.current_message = None
+        self.last_interaction = None
+
+
+class PlayerRegistry:
+    """One MusicPlayer per guild, created on first use and evicted once idle
+
+    A single ticker task refreshes the now-playing UI of every guild that is playing.
+    """
+    def __init__(self, idle_timeout: float = MusicConfig.PLAYER_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._players: dict[int, MusicPlayer] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    def get(self, guild_id: int) -> MusicPlayer:
+        player = self._players.get(guild_id)
+        if player is None:
+            player = self._create(guild_id)
+            logger.info(f"Created music player for guild {guild_id}, active players: {len(self._players)}")
+        return player
+
+    def _create(self, guild_id: int) -> MusicPlayer:
+        """New players pick up the guild's journaled queue, tracks are resolved only when they play"""
+        player = MusicPlayer(guild_id)
+        if JournalConfig.ENABLED:
+            journal = QueueJournal(guild_id)
+            player.music_state.restore(journal.load())
+            player.music_state.attach_journal(journal)
+        self._players[guild_id] = player
+        self._ensure_tasks()
+        return player
+
+    def find(self, guild_id: int) -> Optional[MusicPlayer]:
+        return self._players.get(guild_id)
+
+    def players(self) -> List[MusicPlayer]:
+        return list(self._players.values())
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    async def evict(self, guild_id: int):
+        player = self._players.pop(guild_id, None)
+        if player:
+            await player.close()
+            logger.info(f"Evicted idle music player for guild {guild_id}, active players: {len(self._players)}")
+
+    def _ensure_tasks(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        while self._players:
+            await asyncio.sleep(MusicConfig.UI_REFRESH_INTERVAL)
+            for player in list(self._players.values()):
+                if player.audio_player and player.audio_player.is_playing():
+                    player.music_state.record_position(player.audio_player.time_played)
+                    player.refresh_ui()
+
+    async def _sweep(self):
+        while self._players:
+            await asyncio.sleep(MusicConfig.REGISTRY_SWEEP_INTERVAL)
+            now = time.monotonic()
+            for guild_id, player in list(self._players.items()):
+                if player.is_idle(now, self.idle_timeout):
+                    await self.evict(guild_id)
+
+
+registry = PlayerRegistry()
+metrics.gauge('discord_bot_music_players', 'Guild music players held in memory', callback=registry.__len__)
+metrics.gauge(
+    'discord_bot_voice_sessions', 'Connected voice clients',
+    callback=lambda: sum(1 for player in registry.players() if player.voice_client and player.voice_client.is_connected())
+)
+metrics.gauge(
+    'discord_bot_queue_tracks', 'Tracks waiting in each guild queue', ('guild',),
+    callback=lambda: {(str(player.guild_id),): player.music_state.queue_length() for player in registry.players()}
+)
+
+
+async def restore_sessions(client: discord.Client):
+    """Rebuild the queues journaled before the last shutdown or crash"""
+    if not JournalConfig.ENABLED:
+        return
+    start_time = time.perf_counter()
+    restored = 0
+    for guild_id in QueueJournal.saved_guild_ids():
+        if client.get_guild(guild_id) is None or registry.find(guild_id):
+            continue
+        if registry.get(guild_id).music_state.queue_length():
+            restored += 1
+    elapsed = (time.perf_counter() - start_time) * 1000
+    logger.info(f"Restored {restored} music queue(s) in {elapsed:.1f} ms")
 
-# Initialize single instance
-player = MusicPlayer()
 
 # Export functions for bot commands
 async def play(interaction: discord.Interaction, query: str):
-    await player.play(interaction, query)
+    await registry.get(interaction.guild_id).play(interaction, query)
 
 async def skip(interaction: discord.Interaction):
-    await player.skip(interaction)
+    await registry.get(interaction.guild_id).skip(interaction)
 
 async def previous(interaction: discord.Interaction):
-    await player.previous(interaction)
+    await registry.get(interaction.guild_id).previous(interaction)
 
 async def queue(interaction: discord.Interaction):
-    await player.queue(interaction)
\ No newline at end of file
+    await registry.get(interaction.guild_id).queue(interaction)
+
+async def seek(interaction: discord.Interaction, position: str):
+    await registry.get(interaction.guild_id).seek(interaction, position)
+
+async def move(interaction: discord.Interaction, source: int, destination: int):
+    await registry.get(interaction.guild_id).move(interaction, source, destination)
+
+async def remove(interaction: discord.Interaction, position: int):
+    await registry.get(interaction.guild_id).remove(interaction, position)
+
+async def shuffle(interaction: discord.Interaction):
+    await registry.get(interaction.guild_id).shuffle(interaction)
+
+async def dedupe(interaction: discord.Interaction):
+    await registry.get(interaction.guild_id).dedupe(interaction)
@@ -0,0 +1,272 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.constants import MusicCacheConfig
+from discord_bot_libs.metrics import metrics
+
+
+YOUTUBE_ID_PATTERN = re.compile(r'(?:youtube\.com/(?:watch\?(?:\S*&)?v=|shorts/|embed/)|youtu\.be/)([\w-]{11})')
+URL_EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+def normalize_query(query: str) -> str:
+    """YouTube links are keyed by video id, free text by its lowercased words"""
+    match = YOUTUBE_ID_PATTERN.search(query)
+    if match:
+        return f'id:{match.group(1)}'
+    return ' '.join(query.lower().split())
+
+
+def url_expires_at(url: str, now: Optional[float] = None) -> float:
+    """Read the expire= timestamp googlevideo signs into stream URLs"""
+    match = URL_EXPIRE_PATTERN.search(url)
+    if match:
+        return float(match.group(1))
+    return (now or time.time()) + MusicCacheConfig.DEFAULT_URL_TTL
+
+
+class CacheEntry:
+    __slots__ = ('music_info', 'stored_at', 'url_expires_at')
+
+    def __init__(self, music_info: MusicInfo, stored_at: float, url_expires_at: float):
+        self.music_info = music_info
+        self.stored_at = stored_at
+        self.url_expires_at = url_expires_at
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.stored_at < MusicCacheConfig.METADATA_TTL
+
+    def has_fresh_url(self, now: float) -> bool:
+        """The stream URL must outlive the whole track, not just its start"""
+        return self.url_expires_at > now + self.music_info.duration + MusicCacheConfig.URL_SAFETY_MARGIN
+
+
+class CacheStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.stale_urls = 0
+        self.misses = 0
+        self.resolve_seconds = 0.0
+        self.resolves = 0
+
+    def as_dict(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.stale_urls + self.misses
+        average_resolve = self.resolve_seconds / self.resolves if self.resolves else 0.0
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'stale_urls': self.stale_urls,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'average_resolve_seconds': average_resolve,
+            'saved_seconds': hits * average_resolve,
+        }
+
+
+class MusicInfoCache:
+    """Two-tier MusicInfo cache, an in-memory LRU in front of a SQLite store
+
+    Tracks are stored by video id, queries only map to a video id. Metadata is kept
+    for METADATA_TTL while the signed stream URL is trusted until its expire= time.
+    Safe to call from the resolver worker threads. The memory tier and SQLite have
+    separate locks, the memory lock is only held for dict operations so get_fresh on the
+    event loop never waits on a commit or a prune. The database is opened on first use
+    and pruned to MAX_DISK_ENTRIES tracks younger than METADATA_TTL.
+    """
+    def __init__(self, path: str = MusicCacheConfig.DB_PATH, memory_entries: int = MusicCacheConfig.MEMORY_ENTRIES):
+        self.memory_entries = memory_entries
+        self.stats = CacheStats()
+        self._tracks: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._queries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()  # Memory tier and stats
+        self._db_lock = threading.Lock()  # SQLite connection
+        self._path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_opened = False
+        self._writes = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Call with the database lock held"""
+        if not self._db_opened:
+            self._db_opened = True
+            self._db = self._open_db(self._path)
+            if self._db is not None:
+                self._prune()
+        return self._db
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS tracks (video_id TEXT PRIMARY KEY, info TEXT NOT NULL, stored_at REAL NOT NULL, url_expires_at REAL NOT NULL)')
+            db.execute('CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, video_id TEXT NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS tracks_stored_at ON tracks (stored_at)')
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            logger.error(f"Music cache running memory-only, failed to open {path}: {e}")
+            return None
+
+    def get_fresh(self, query: str) -> Optional[MusicInfo]:
+        """Memory-only lookup cheap enough for the event loop, returns only playable entries"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory_get(normalize_query(query))
+            if entry and entry.is_fresh(now) and entry.has_fresh_url(now):
+                self.stats.memory_hits += 1
+                return entry.music_info
+        return None
+
+    def lookup(self, query: str) -> tuple[Optional[MusicInfo], bool]:
+        """Look through both tiers, returns the cached MusicInfo and whether its URL is still playable"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._memory_get(key)
+        from_disk = entry is None
+        if from_disk:
+            with self._db_lock:
+                entry = self._disk_get(key)
+        with self._lock:
+            if from_disk and entry is not None:
+                self._memory_put(key, entry)
+            if entry is None or not entry.is_fresh(now):
+                self.stats.misses += 1
+                return None, False
+            if not entry.has_fresh_url(now):
+                self.stats.stale_urls += 1
+                return entry.music_info, False
+            if from_disk:
+                self.stats.disk_hits += 1
+            else:
+                self.stats.memory_hits += 1
+            return entry.music_info, True
+
+    def put(self, query: str, music_info: MusicInfo, resolve_seconds: float = 0.0):
+        now = time.time()
+        entry = CacheEntry(music_info, now, url_expires_at(music_info.url, now))
+        key = normalize_query(query)
+        with self._lock:
+            if resolve_seconds:
+                self.stats.resolve_seconds += resolve_seconds
+                self.stats.resolves += 1
+            self._memory_put(key, entry)
+        with self._db_lock:
+            self._disk_put(key, entry)
+
+    def recent_titles(self, limit: int) -> list[tuple[str, str]]:
+        """(title, webpage_url) of the most recently stored tracks, newest first"""
+        try:
+            with self._db_lock:
+                db = self._connection()
+                if db is None:
+                    return []
+                return db.execute(
+                    "SELECT json_extract(info, '$.title'), json_extract(info, '$.webpage_url') FROM tracks ORDER BY stored_at DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Music cache read failed: {e}")
+            return []
+
+    def clear_memory(self):
+        with self._lock:
+            self._tracks.clear()
+            self._queries.clear()
+
+    def size(self) -> int:
+        return len(self._tracks)
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        video_id = key[3:] if key.startswith('id:') else self._queries.get(key)
+        if video_id is None:
+            return None
+        entry = self._tracks.get(video_id)
+        if entry is not None:
+            self._tracks.move_to_end(video_id)
+            if key in self._queries:
+                self._queries.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: str, entry: CacheEntry):
+        video_id = entry.music_info.video_id
+        self._tracks[video_id] = entry
+        self._tracks.move_to_end(video_id)
+        if not key.startswith('id:'):
+            self._queries[key] = video_id
+            self._queries.move_to_end(key)
+        while len(self._tracks) > self.memory_entries:
+            self._tracks.popitem(last=False)
+        while len(self._queries) > self.memory_entries * 2:
+            self._queries.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        db = self._connection()
+        if db is None:
+            return None
+        try:
+            if key.startswith('id:'):
+                row = db.execute('SELECT info, stored_at, url_expires_at FROM tracks WHERE video_id = ?', (key[3:],)).fetchone()
+            else:
+                row = db.execute(
+                    'SELECT t.info, t.stored_at, t.url_expires_at FROM queries q JOIN tracks t ON t.video_id = q.video_id WHERE q.query = ?',
+                    (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Music cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return CacheEntry(MusicInfo.model_validate_json(row[0]), row[1], row[2])
+
+    def _disk_put(self, key: str, entry: CacheEntry):
+        db = self._connection()
+        if db is None:
+            return
+        music_info = entry.music_info
+        try:
+            db.execute(
+                'INSERT OR REPLACE INTO tracks (video_id, info, stored_at, url_expires_at) VALUES (?, ?, ?, ?)',
+                (music_info.video_id, music_info.model_dump_json(exclude={'description'}), entry.stored_at, entry.url_expires_at)
+            )
+            if not key.startswith('id:'):
+                db.execute('INSERT OR REPLACE INTO queries (query, video_id) VALUES (?, ?)', (key, music_info.video_id))
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Music cache write failed: {e}")
+            return
+        self._writes += 1
+        if self._writes % MusicCacheConfig.PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        """Drop tracks past METADATA_TTL and the oldest beyond MAX_DISK_ENTRIES, with their queries"""
+        try:
+            expired = self._db.execute('DELETE FROM tracks WHERE stored_at < ?', (time.time() - MusicCacheConfig.METADATA_TTL,)).rowcount
+            overflow = self._db.execute(
+                'DELETE FROM tracks WHERE video_id NOT IN (SELECT video_id FROM tracks ORDER BY stored_at DESC LIMIT ?)',
+                (MusicCacheConfig.MAX_DISK_ENTRIES,)
+            ).rowcount
+            if expired or overflow:
+                self._db.execute('DELETE FROM queries WHERE video_id NOT IN (SELECT video_id FROM tracks)')
+                logger.info(f"Music cache pruned {expired} expired and {overflow} overflowing tracks")
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Music cache prune failed: {e}")
+
+
+music_cache = MusicInfoCache()
+metrics.gauge('discord_bot_music_cache_entries', 'Tracks in the in-memory music info cache', callback=music_cache.size)
+metrics.gauge('discord_bot_music_cache_hit_ratio', 'Share of resolves answered by the music info cache', callback=lambda: music_cache.stats.as_dict()['hit_rate'])
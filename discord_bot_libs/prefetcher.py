@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicState, RequestInfo
+from discord_bot_libs.audio_cache import audio_cache
+from discord_bot_libs.audio_source import probe_codec
+from discord_bot_libs.constants import PrefetchConfig
+from discord_bot_libs.loudness import loudness_index
+from discord_bot_libs.music_cache import url_expires_at
+from discord_bot_libs.resolver import resolver
+
+
+class TrackPrefetcher:
+    """Keep the next few queued tracks ready to play while the current one is playing
+
+    A track is hot when it is in the audio cache or its stream URL stays valid until
+    REFRESH_HORIZON seconds after it is expected to end, counting the queued tracks in
+    front of it.
+    """
+    def __init__(self, music_state: MusicState, depth: int = PrefetchConfig.DEPTH, horizon: float = PrefetchConfig.REFRESH_HORIZON, probe: bool = PrefetchConfig.PROBE):
+        self.music_state = music_state
+        self.depth = depth
+        self.horizon = horizon
+        self.probe = probe
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def poke(self):
+        """Ask for a prefetch pass, call after the queue or the current track changes"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def is_hot(self, request_info: RequestInfo, starts_in: float = 0) -> bool:
+        music_info = request_info.music_info
+        if audio_cache.contains(music_info.video_id):
+            return True
+        if not music_info.url:
+            return False
+        ends_at = time.time() + starts_in + music_info.duration
+        return url_expires_at(music_info.url) > ends_at + self.horizon
+
+    async def prepare(self, request_info: RequestInfo, starts_in: float = 0) -> bool:
+        """Refresh the stream URL if needed, returns False when the track cannot be played"""
+        if not self.is_hot(request_info, starts_in):
+            music_info = await resolver.resolve(request_info.music_info.webpage_url, refresh=bool(request_info.music_info.url))
+            if not music_info:
+                logger.warning(f"Prefetch failed for: {request_info.music_info.title}")
+                return bool(request_info.music_info.url)
+            request_info.music_info = music_info
+
+        if self.probe:
+            await probe_codec(request_info.music_info)
+        loudness_index.request(request_info.music_info)
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), PrefetchConfig.INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            starts_in = 0
+            for request_info in self.music_state.get_queue_slice(0, self.depth):
+                try:
+                    await self.prepare(request_info, starts_in)
+                except Exception as e:
+                    logger.error(f"Error prefetching {request_info.music_info.title}: {e}")
+                starts_in += request_info.music_info.duration
@@ -0,0 +1,145 @@
+import json
+import os
+from collections import deque
+from typing import List, Optional
+
+from loguru import logger
+
+from discord_bot_libs.constants import JournalConfig, MusicConfig
+
+
+SNAPSHOT_SUFFIX = '.snapshot.json'
+JOURNAL_SUFFIX = '.journal.jsonl'
+
+
+class QueueJournal:
+    """Append-only journal of one guild's queue operations, compacted into snapshots
+
+    Every operation carries a sequence number and each snapshot stores the last number
+    it includes, so a crash between writing a snapshot and truncating the journal does
+    not apply any operation twice. Tracks are stored without their stream URL.
+    """
+    def __init__(self, guild_id: int, directory: str = JournalConfig.DIRECTORY):
+        self.guild_id = guild_id
+        self.snapshot_path = os.path.join(directory, f'{guild_id}{SNAPSHOT_SUFFIX}')
+        self.journal_path = os.path.join(directory, f'{guild_id}{JOURNAL_SUFFIX}')
+        self._file = None
+        self._seq = 0
+        self._ops_since_snapshot = 0
+
+    @staticmethod
+    def saved_guild_ids(directory: str = JournalConfig.DIRECTORY) -> List[int]:
+        if not os.path.isdir(directory):
+            return []
+        return [int(name[:-len(SNAPSHOT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SNAPSHOT_SUFFIX)]
+
+    def load(self) -> dict:
+        """Replay the latest snapshot and the journal tail into plain queue state"""
+        snapshot = {}
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read queue snapshot {self.snapshot_path}: {e}")
+
+        ops = []
+        try:
+            with open(self.journal_path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError:
+                        # A crash can leave a half written last line
+                        break
+        except FileNotFoundError:
+            pass
+        return replay(snapshot, ops)
+
+    def start(self, state: dict):
+        """Begin journaling from a snapshot of the given state"""
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        self.write_snapshot(state)
+
+    def append(self, op: str, **data) -> bool:
+        """Record an operation, returns True when it is time to write a new snapshot"""
+        if self._file is None:
+            return False
+        self._seq += 1
+        data['op'] = op
+        data['n'] = self._seq
+        try:
+            self._file.write(json.dumps(data, separators=(',', ':'), ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"Failed to append to queue journal {self.journal_path}: {e}")
+        self._ops_since_snapshot += 1
+        return self._ops_since_snapshot >= JournalConfig.COMPACT_EVERY
+
+    def write_snapshot(self, state: dict):
+        state['seq'] = self._seq
+        tmp_path = f'{self.snapshot_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file, separators=(',', ':'), ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+            if self._file:
+                self._file.close()
+            self._file = open(self.journal_path, 'w', encoding='utf-8', buffering=1)
+            self._ops_since_snapshot = 0
+        except OSError as e:
+            logger.error(f"Failed to write queue snapshot {self.snapshot_path}: {e}")
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def replay(snapshot: dict, ops: List[dict], max_history_length: int = MusicConfig.MAX_HISTORY_LENGTH) -> dict:
+    queue = deque(snapshot.get('queue', []))
+    history = deque(snapshot.get('history', []), maxlen=max_history_length)
+    current: Optional[dict] = snapshot.get('current')
+    position = snapshot.get('position', 0)
+    seq = snapshot.get('seq', 0)
+
+    for op in ops:
+        if op.get('n', 0) <= seq:
+            continue
+        kind = op['op']
+        if kind == 'add':
+            index = op['pos']
+            if index == -1 or index >= len(queue):
+                queue.append(op['track'])
+            else:
+                queue.insert(index, op['track'])
+        elif kind == 'next':
+            current = queue.popleft() if queue else None
+            position = 0
+        elif kind == 'current':
+            current = op['track']
+            position = 0
+        elif kind == 'stop':
+            current = None
+            position = 0
+        elif kind == 'history':
+            history.appendleft(op['track'])
+        elif kind == 'previous':
+            if history:
+                history.popleft()
+        elif kind == 'remove':
+            if 0 <= op['pos'] < len(queue):
+                del queue[op['pos']]
+        elif kind == 'move':
+            if 0 <= op['src'] < len(queue) and 0 <= op['dst'] < len(queue):
+                track = queue[op['src']]
+                del queue[op['src']]
+                queue.insert(op['dst'], track)
+        elif kind == 'clear_queue':
+            queue.clear()
+        elif kind == 'clear_history':
+            history.clear()
+        elif kind == 'position':
+            position = op['t']
+
+    return {'queue': list(queue), 'history': list(history), 'current': current, 'position': position}
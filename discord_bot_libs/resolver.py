@@ -0,0 +1,228 @@
+import asyncio
+import importlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+
+from loguru import logger
+
+from discord_bot_api.model.music_model import MusicInfo, map_music_info, map_playlist_entry
+from discord_bot_libs.constants import ResolverConfig
+from discord_bot_libs.metrics import metrics
+from discord_bot_libs.music_cache import MusicInfoCache, music_cache
+
+if TYPE_CHECKING:
+    import yt_dlp
+
+
+YDL_OPTIONS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'quiet': True,
+    'default_search': 'ytsearch',
+    'socket_timeout': ResolverConfig.SOCKET_TIMEOUT,
+}
+
+YDL_PLAYLIST_OPTIONS = {
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+    'noplaylist': False,
+    'quiet': True,
+    'socket_timeout': ResolverConfig.SOCKET_TIMEOUT,
+}
+
+YDL_SEARCH_OPTIONS = {
+    'extract_flat': 'in_playlist',
+    'quiet': True,
+    'socket_timeout': ResolverConfig.SOCKET_TIMEOUT,
+}
+
+PLAYLIST_PATTERN = re.compile(r'^https?://\S*(?:[?&]list=|/playlist\b|/sets/)')
+UNAVAILABLE_TITLES = ('[Private video]', '[Deleted video]')
+_END = object()
+
+RESOLVE_SECONDS = metrics.histogram('discord_bot_resolve_seconds', 'Time yt-dlp takes to extract one track')
+
+
+def is_playlist(query: str) -> bool:
+    """Playlist and mix links, a watch link with list= plays the whole list"""
+    return bool(PLAYLIST_PATTERN.match(query.strip()))
+
+
+class MusicResolver:
+    """Resolve queries with yt-dlp on a bounded worker pool so the event loop never blocks
+
+    Identical queries that are in flight at the same time share one extraction and
+    results are served from the MusicInfoCache while their stream URL is still valid.
+    """
+    def __init__(self, max_workers: int = ResolverConfig.MAX_WORKERS, timeout: float = ResolverConfig.TIMEOUT, cache: Optional[MusicInfoCache] = music_cache):
+        self.timeout = timeout
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='resolver')
+        self._playlist_executor = ThreadPoolExecutor(max_workers=ResolverConfig.PLAYLIST_WORKERS, thread_name_prefix='playlist')
+        self._search_executor = ThreadPoolExecutor(max_workers=ResolverConfig.SEARCH_WORKERS, thread_name_prefix='search')
+        self._local = threading.local()
+        self._pending: dict[tuple[str, bool], asyncio.Future] = {}
+        self._waiters: dict[tuple[str, bool], int] = {}
+
+    async def resolve(self, query: str, timeout: Optional[float] = None, refresh: bool = False) -> Optional[MusicInfo]:
+        """Resolve a query or URL, returns None on failure or timeout
+
+        refresh skips the cached stream URL, used when a URL is about to expire.
+        """
+        key = query.strip()
+        if self.cache and not refresh:
+            music_info = self.cache.get_fresh(key)
+            if music_info:
+                return music_info
+
+        pending_key = (key, refresh)
+        future = self._pending.get(pending_key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._resolve_sync, key, refresh)
+            self._pending[pending_key] = future
+            future.add_done_callback(lambda f: self._forget(pending_key, f))
+
+        self._waiters[pending_key] = self._waiters.get(pending_key, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out resolving: {key}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to get music info: {e}")
+            return None
+        finally:
+            self._release(pending_key, future)
+
+    def _release(self, pending_key: tuple[str, bool], future: asyncio.Future):
+        """Drop a waiter and cancel the extraction once nobody is waiting for it"""
+        self._waiters[pending_key] -= 1
+        if self._waiters[pending_key] > 0:
+            return
+        del self._waiters[pending_key]
+        if not future.done():
+            # Only cancels jobs still queued, a running extraction finishes and is discarded
+            future.cancel()
+            self._forget(pending_key, future)
+
+    def _forget(self, pending_key: tuple[str, bool], future: asyncio.Future):
+        if self._pending.get(pending_key) is future:
+            del self._pending[pending_key]
+
+    async def iter_playlist(self, url: str, limit: int) -> AsyncIterator[MusicInfo]:
+        """Stream the entries of a playlist as unresolved MusicInfo, without their stream URLs
+
+        A flat extraction lists the entries page by page on a worker thread, so the first
+        entries arrive before the rest of the playlist has been fetched. Stop iterating
+        (or close the generator) to stop the extraction.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=ResolverConfig.PLAYLIST_BUFFER)
+        stop = threading.Event()
+        loop.run_in_executor(self._playlist_executor, self._stream_playlist, url.strip(), limit, loop, queue, stop)
+        try:
+            while True:
+                music_info = await queue.get()
+                if music_info is _END:
+                    return
+                yield music_info
+        finally:
+            stop.set()
+
+    def _stream_playlist(self, url: str, limit: int, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, stop: threading.Event):
+        count = 0
+        try:
+            ydl = self._get_ydl('playlist_ydl', YDL_PLAYLIST_OPTIONS)
+            info = ydl.extract_info(url, download=False, process=False)
+            # Mixes and watch links redirect to the playlist extractor
+            for _ in range(3):
+                if info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+
+            for entry in info.get('entries') or []:
+                if count >= limit or stop.is_set():
+                    break
+                if not entry or entry.get('title') in UNAVAILABLE_TITLES:
+                    continue
+                if not self._push(loop, queue, map_playlist_entry(entry), stop):
+                    break
+                count += 1
+        except Exception as e:
+            logger.error(f"Failed to read playlist {url}: {e}")
+        finally:
+            logger.info(f"Read {count} entries from playlist: {url}")
+            self._push(loop, queue, _END, stop)
+
+    @staticmethod
+    def _push(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, item, stop: threading.Event) -> bool:
+        """Hand an item to the loop, blocking while the consumer is behind"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stop.is_set():
+            try:
+                future.result(timeout=1)
+                return True
+            except FutureTimeoutError:
+                continue
+        future.cancel()
+        return False
+
+    def search(self, query: str, count: int) -> asyncio.Future:
+        """List the top search hits as unresolved MusicInfo, without their stream URLs"""
+        return asyncio.get_running_loop().run_in_executor(self._search_executor, self._search_sync, query, count)
+
+    def _search_sync(self, query: str, count: int) -> List[MusicInfo]:
+        info = self._get_ydl('search_ydl', YDL_SEARCH_OPTIONS).extract_info(f'ytsearch{count}:{query}', download=False)
+        return [
+            map_playlist_entry(entry) for entry in info.get('entries') or []
+            if entry and entry.get('url') and entry.get('title') not in UNAVAILABLE_TITLES
+        ]
+
+    def warm_up(self) -> asyncio.Future:
+        """Import yt-dlp on a worker thread, off the startup path but before the first /play"""
+        return asyncio.get_running_loop().run_in_executor(self._executor, importlib.import_module, 'yt_dlp')
+
+    def _get_ydl(self, name: str = 'ydl', options: dict = YDL_OPTIONS) -> 'yt_dlp.YoutubeDL':
+        """Each worker thread keeps its own YoutubeDL, the instances are not thread-safe"""
+        ydl = getattr(self._local, name, None)
+        if ydl is None:
+            # yt-dlp and its extractor registry load on first use, see warm_up
+            ydl = importlib.import_module('yt_dlp').YoutubeDL(options)
+            setattr(self._local, name, ydl)
+        return ydl
+
+    def _resolve_sync(self, query: str, refresh: bool = False) -> MusicInfo:
+        """Runs on a worker thread, checks the disk tier before paying for an extraction"""
+        target = query
+        if self.cache and not refresh:
+            music_info, url_fresh = self.cache.lookup(query)
+            if url_fresh:
+                return music_info
+            if music_info:
+                # Metadata is known, re-extract the video directly instead of searching again
+                target = music_info.webpage_url
+
+        start_time = time.perf_counter()
+        music_info = self._extract(target)
+        resolve_seconds = time.perf_counter() - start_time
+        RESOLVE_SECONDS.observe(resolve_seconds)
+        if self.cache:
+            self.cache.put(query, music_info, resolve_seconds)
+        return music_info
+
+    def _extract(self, query: str) -> MusicInfo:
+        info = self._get_ydl().extract_info(query, download=False)
+        if 'entries' in info:
+            info = info['entries'][0]
+        return map_music_info(info)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._playlist_executor.shutdown(wait=False, cancel_futures=True)
+        self._search_executor.shutdown(wait=False, cancel_futures=True)
+
+
+resolver = MusicResolver()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Optional
+
+from loguru import logger
+
+from discord_bot_libs.constants import WatchdogConfig
+from discord_bot_libs.metrics import metrics
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STALLS = metrics.counter('discord_bot_event_loop_stalls_total', 'Event loop stalls longer than the watchdog threshold')
+
+
+class StallWatchdog:
+    """Find what blocks the event loop by sampling its stack from a separate thread
+
+    A task on the loop stamps a heartbeat every interval. When the watchdog thread sees
+    the heartbeat older than threshold, the loop is stuck in one callback and the stack
+    of the loop thread is exactly what blocks it. Samples are counted per call site, the
+    innermost frame of this project, and the first stack of each stall is logged.
+    """
+    def __init__(self, threshold: float = WatchdogConfig.THRESHOLD, interval: float = WatchdogConfig.INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.longest_stall = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._samples: Counter = Counter()
+        self._stall_counts: Counter = Counter()
+        self._stacks: dict[str, str] = {}
+
+    def start(self):
+        """Call from the event loop thread"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='stall-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"Stall watchdog started, threshold {self.threshold * 1000:.0f} ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def report(self) -> dict:
+        with self._lock:
+            sites = [
+                {'site': site, 'samples': samples, 'stalls': self._stall_counts[site], 'stack': self._stacks.get(site, '')}
+                for site, samples in self._samples.most_common()
+            ]
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'threshold_seconds': self.threshold,
+            'stalls': self.stalls,
+            'longest_stall_seconds': self.longest_stall,
+            'sites': sites,
+        }
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        stall_started = None
+        stall_sites = set()
+        while not self._stop.wait(self.interval):
+            lag = time.monotonic() - self._heartbeat - self.interval
+            if lag < self.threshold:
+                if stall_started is not None:
+                    self._end_stall(time.monotonic() - stall_started, stall_sites)
+                    stall_started = None
+                    stall_sites = set()
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            site = self._call_site(stack)
+            with self._lock:
+                self._samples[site] += 1
+                if site not in stall_sites:
+                    self._stall_counts[site] += 1
+                if site not in self._stacks and len(self._stacks) < WatchdogConfig.MAX_SITES:
+                    self._stacks[site] = ''.join(traceback.format_list(stack))
+            if stall_started is None:
+                stall_started = self._heartbeat + self.interval
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms at {site}\n{''.join(traceback.format_list(stack[-WatchdogConfig.STACK_DEPTH:]))}")
+            stall_sites.add(site)
+
+    def _end_stall(self, duration: float, sites: set):
+        self.stalls += 1
+        self.longest_stall = max(self.longest_stall, duration)
+        STALLS.inc()
+        logger.warning(f"Event loop stall ended after {duration * 1000:.0f} ms, blocked at {', '.join(sorted(sites))}")
+
+    @staticmethod
+    def _call_site(stack: traceback.StackSummary) -> str:
+        """Innermost frame in this project's code, or the innermost frame when there is none"""
+        for frame in reversed(stack):
+            path = os.path.abspath(frame.filename)
+            if path.startswith(PROJECT_ROOT) and f'{os.sep}site-packages{os.sep}' not in path:
+                return f'{os.path.relpath(path, PROJECT_ROOT)}:{frame.lineno} {frame.name}'
+        frame = stack[-1]
+        return f'{frame.filename}:{frame.lineno} {frame.name}'
+
+
+stall_watchdog = StallWatchdog()
@@ -0,0 +1,136 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+# Read here rather than from constants, importing constants loads discord.py before the
+# import hook could time it
+ENABLED = os.getenv('STARTUP_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+TOP_MODULES = 25  # Slowest imports listed in the report
+
+
+def _process_age() -> float:
+    """Seconds since the interpreter process started, so the report includes Python's own startup"""
+    try:
+        with open('/proc/self/stat') as stat, open('/proc/uptime') as uptime:
+            started_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+            return max(0.0, float(uptime.read().split()[0]) - started_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0  # Not Linux, count from this import instead
+
+
+class _ImportTimer(MetaPathFinder):
+    """Times exec_module of every module imported after install, cumulative and self time"""
+    def __init__(self, profile: 'StartupProfile'):
+        self.profile = profile
+        self._local = threading.local()  # Modules may be imported on worker threads too
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Built-in and frozen loaders are shared classes, patching them would leak to every module
+        if loader is None or isinstance(loader, type) or not hasattr(loader, 'exec_module'):
+            return spec
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module):
+            stack = self._stack()
+            frame = [time.perf_counter(), 0.0]
+            stack.append(frame)
+            try:
+                exec_module(module)
+            finally:
+                stack.pop()
+                elapsed = time.perf_counter() - frame[0]
+                if stack:
+                    stack[-1][1] += elapsed
+                self.profile.imports[fullname] = (elapsed, elapsed - frame[1])
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+    def _stack(self) -> List[List[float]]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+class StartupProfile:
+    """Import and initialization timings from process start to the first command the bot can serve
+
+    Off unless STARTUP_PROFILE is set. Install it before the heavy imports in main.py; the
+    report is logged once the bot is ready.
+    """
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.started_at = time.perf_counter() - (_process_age() if enabled else 0.0)
+        self.imports: Dict[str, tuple] = {}
+        self.phases: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._timer: Optional[_ImportTimer] = None
+
+    def install(self):
+        if self.enabled and self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def uninstall(self):
+        if self._timer is not None:
+            sys.meta_path.remove(self._timer)
+            self._timer = None
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start_time
+
+    def mark(self, name: str):
+        """Seconds from process start to a milestone such as the end of imports"""
+        if self.enabled:
+            self.marks[name] = time.perf_counter() - self.started_at
+
+    def report(self) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:TOP_MODULES]
+        return {
+            'marks_ms': {name: seconds * 1000 for name, seconds in self.marks.items()},
+            'phases_ms': {name: seconds * 1000 for name, seconds in self.phases.items()},
+            'imports_ms': {name: {'cumulative': total * 1000, 'self': own * 1000} for name, (total, own) in slowest},
+        }
+
+    def finish(self):
+        """Stop timing imports and log the report, call once the bot serves commands"""
+        if not self.enabled or 'ready' in self.marks:
+            return
+        self.mark('ready')
+        self.uninstall()
+        report = self.report()
+        lines = [f"  {name}: {ms:.1f} ms" for name, ms in report['marks_ms'].items()]
+        lines += [f"  phase {name}: {ms:.1f} ms" for name, ms in report['phases_ms'].items()]
+        lines += [
+            f"  import {name}: {times['cumulative']:.1f} ms ({times['self']:.1f} ms self)"
+            for name, times in report['imports_ms'].items()
+        ]
+        logger.info("Startup profile:\n" + '\n'.join(lines))
+
+
+startup_profile = StartupProfile()
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import discord
+from loguru import logger
+
+from discord_bot_libs.constants import EditConfig
+from discord_bot_libs.metrics import metrics
+
+
+EDIT_SECONDS = metrics.histogram('discord_bot_message_edit_seconds', 'Latency of now-playing message edits')
+
+
+class PendingEdit:
+    __slots__ = ('message', 'embed', 'view', 'fallback', 'signature')
+
+    def __init__(self, message: discord.Message, embed: discord.Embed, view: Optional[discord.ui.View], fallback: Optional[Callable[[], Awaitable]]):
+        self.message = message
+        self.embed = embed
+        self.view = view
+        self.fallback = fallback
+        self.signature = self._sign(embed, view)
+
+    @staticmethod
+    def _sign(embed: discord.Embed, view: Optional[discord.ui.View]) -> str:
+        labels = [getattr(item, 'label', None) for item in view.children] if view else []
+        payload = json.dumps([embed.to_dict(), labels], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class EditStats:
+    def __init__(self):
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.latencies = deque(maxlen=256)
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'rate_limited': self.rate_limited,
+            'latency_p50': percentile(0.50),
+            'latency_p95': percentile(0.95),
+        }
+
+
+class MessageEditScheduler:
+    """Send message edits from one place, at most one in flight per channel
+
+    Only the latest state of a message is kept while it waits, edits that would not
+    change the rendered message are dropped, and each channel's interval backs off on
+    rate limits and recovers after fast edits. discord.py waits out 429s on its own, so
+    an unusually slow edit is treated as a rate-limit signal as well.
+    """
+    def __init__(self, interval: float = EditConfig.MIN_INTERVAL):
+        self.base_interval = interval
+        self.stats = EditStats()
+        self._pending: dict[int, PendingEdit] = {}
+        self._last_signature: dict[int, str] = {}
+        self._intervals: dict[int, float] = {}
+        self._next_allowed: dict[int, float] = {}
+        self._in_flight: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_report = time.monotonic()
+
+    def submit(self, message: discord.Message, embed: discord.Embed, view: Optional[discord.ui.View] = None, fallback: Optional[Callable[[], Awaitable]] = None):
+        """Queue an edit, replacing any edit of the same message that has not been sent yet
+
+        fallback runs when the message is gone or the edit fails for another reason than a rate limit.
+        """
+        edit = PendingEdit(message, embed, view, fallback)
+        if self._last_signature.get(message.id) == edit.signature:
+            self.stats.skipped += 1
+            self._pending.pop(message.id, None)
+            return
+        if message.id in self._pending:
+            self.stats.coalesced += 1
+        self._pending[message.id] = edit
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def forget(self, message: discord.Message):
+        """Drop state kept for a message that is no longer updated"""
+        self._pending.pop(message.id, None)
+        self._last_signature.pop(message.id, None)
+
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending or self._tasks:
+            self._wakeup.clear()
+            now = time.monotonic()
+            wait = None
+            for message_id, edit in list(self._pending.items()):
+                channel_id = edit.message.channel.id
+                if channel_id in self._in_flight:
+                    continue
+                ready_at = self._next_allowed.get(channel_id, 0)
+                if ready_at > now:
+                    wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                    continue
+                del self._pending[message_id]
+                self._in_flight.add(channel_id)
+                task = asyncio.create_task(self._send(edit))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            self._maybe_report()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, edit: PendingEdit):
+        message = edit.message
+        channel_id = message.channel.id
+        interval = self._intervals.get(channel_id, self.base_interval)
+        start_time = time.monotonic()
+        try:
+            await message.edit(embed=edit.embed, view=edit.view)
+            latency = time.monotonic() - start_time
+            self.stats.sent += 1
+            self.stats.latencies.append(latency)
+            EDIT_SECONDS.observe(latency)
+            self._last_signature[message.id] = edit.signature
+            if latency > EditConfig.SLOW_EDIT_SECONDS:
+                interval = min(interval * 2, EditConfig.MAX_INTERVAL)
+            else:
+                interval = max(interval * 0.8, self.base_interval)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.stats.rate_limited += 1
+                interval = min(interval * 2, EditConfig.MAX_INTERVAL)
+                retry_after = self._retry_after(e)
+                interval = max(interval, retry_after)
+                self._pending.setdefault(message.id, edit)
+            else:
+                self.stats.failed += 1
+                if not isinstance(e, discord.NotFound):
+                    logger.error(f"HTTPException when editing message: {e}")
+                self.forget(message)
+                await self._run_fallback(edit)
+        except Exception as e:
+            self.stats.failed += 1
+            logger.error(f"Error editing message: {e}")
+        finally:
+            self._intervals[channel_id] = interval
+            self._next_allowed[channel_id] = time.monotonic() + interval
+            self._in_flight.discard(channel_id)
+            if self._wakeup:
+                self._wakeup.set()
+
+    @staticmethod
+    def _retry_after(error: discord.HTTPException) -> float:
+        headers = getattr(error.response, 'headers', None) or {}
+        for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+            try:
+                return float(headers[header])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return 0.0
+
+    @staticmethod
+    async def _run_fallback(edit: PendingEdit):
+        if edit.fallback is None:
+            return
+        try:
+            await edit.fallback()
+        except Exception as e:
+            logger.error(f"Error replacing message: {e}")
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < EditConfig.REPORT_INTERVAL:
+            return
+        self._last_report = now
+        logger.info(f"Message edits: {self.stats.as_dict()}")
+
+
+edit_scheduler = MessageEditScheduler()
+metrics.gauge('discord_bot_message_edit_backlog', 'Message edits waiting to be sent', callback=edit_scheduler.backlog)
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from typing import Optional
+
+import discord
+from loguru import logger
+
+from discord_bot_libs.constants import ExpiryConfig, MetricsConfig
+from discord_bot_libs.metrics import metrics
+
+
+BACKLOG = metrics.histogram('discord_bot_temp_message_backlog', 'Temporary messages waiting for deletion, sampled when one is scheduled', MetricsConfig.BACKLOG_BUCKETS)
+
+
+class MessageExpiryScheduler:
+    """Delete temporary messages when they expire, from one heap and one task
+
+    Scheduling returns immediately. Messages that expire within BATCH_WINDOW of each other
+    in the same channel are removed with a single bulk delete when the bot may manage
+    messages there, otherwise one by one.
+    """
+    def __init__(self, batch_window: float = ExpiryConfig.BATCH_WINDOW):
+        self.batch_window = batch_window
+        self.deleted = 0
+        self.bulk_deletes = 0
+        self._heap: list[tuple[float, int, discord.Message]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def schedule(self, message: discord.Message, delete_after: float):
+        heapq.heappush(self._heap, (time.monotonic() + delete_after, next(self._counter), message))
+        BACKLOG.observe(len(self._heap))
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def _run(self):
+        while self._heap:
+            self._wakeup.clear()
+            wait = self._heap[0][0] - time.monotonic()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due_by = time.monotonic() + self.batch_window
+            by_channel: dict[int, list[discord.Message]] = defaultdict(list)
+            while self._heap and self._heap[0][0] <= due_by:
+                message = heapq.heappop(self._heap)[2]
+                by_channel[message.channel.id].append(message)
+            for messages in by_channel.values():
+                await self._delete(messages)
+
+    async def _delete(self, messages: list[discord.Message]):
+        channel = messages[0].channel
+        for start in range(0, len(messages), ExpiryConfig.MAX_BULK_DELETE):
+            batch = messages[start:start + ExpiryConfig.MAX_BULK_DELETE]
+            if len(batch) > 1 and self._can_bulk_delete(channel):
+                try:
+                    await channel.delete_messages(batch)
+                    self.deleted += len(batch)
+                    self.bulk_deletes += 1
+                    continue
+                except discord.HTTPException as e:
+                    logger.warning(f"Bulk delete failed, deleting one by one: {e}")
+            for message in batch:
+                try:
+                    await message.delete()
+                    self.deleted += 1
+                except discord.NotFound:
+                    pass  # Message already deleted
+                except Exception as e:
+                    logger.error(f"Error deleting temporary message: {e}")
+
+    @staticmethod
+    def _can_bulk_delete(channel) -> bool:
+        guild = getattr(channel, 'guild', None)
+        if guild is None or not hasattr(channel, 'delete_messages'):
+            return False
+        return channel.permissions_for(guild.me).manage_messages
+
+
+expiry_scheduler = MessageExpiryScheduler()
+metrics.gauge('discord_bot_temp_messages_pending', 'Temporary messages waiting for deletion', callback=expiry_scheduler.pending)
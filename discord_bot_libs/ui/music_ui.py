@@ -1,8 +1,10 @@
+from typing import Optional
+
 import discord
 from loguru import logger
 
-from discord_bot_api.model.music_model import MusicInfo, RequestInfo
-from discord_bot_libs.constants import Author, Embed, ProcessBar, TimeConfig
+from discord_bot_api.model.music_model import MusicInfo, MusicState, RequestInfo
+from discord_bot_libs.constants import Author, Embed, MusicConfig, ProcessBar, TimeConfig
 
 
 class MusicControlButtons(discord.ui.View):
@@ -10,6 +12,8 @@ class MusicControlButtons(discord.ui.View):
         super().__init__(timeout=None)
         self.voice_client = voice_client
         self.music_manager = music_manager
+        if voice_client and voice_client.is_paused():
+            self.pause_button.label = "▶️ Play"
 
     @discord.ui.button(label="⏭️ Previous", style=discord.ButtonStyle.secondary)
     async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -27,11 +31,9 @@ class MusicControlButtons(discord.ui.View):
         await interaction.response.defer()
         logger.info("Pause button clicked")
         
-        if self.voice_client.is_playing():
-            self.voice_client.pause()
+        if self.music_manager.toggle_pause():
             button.label = "▶️ Play"
         else:
-            self.voice_client.resume()
             button.label = "⏸️ Pause"
             
         await interaction.message.edit(view=self)
@@ -48,6 +50,66 @@ class MusicControlButtons(discord.ui.View):
             await interaction.followup.send("❌ An error occurred while skipping!", ephemeral=True)
 
 
+class QueuePages:
+    """Rendered /queue pages of one guild, dropped as soon as the queue version changes"""
+    def __init__(self, music_state: MusicState, page_size: int = MusicConfig.QUEUE_PAGE_SIZE):
+        self.music_state = music_state
+        self.page_size = page_size
+        self.hits = 0
+        self.misses = 0
+        self._version = -1
+        self._pages: dict[int, discord.Embed] = {}
+
+    def page_count(self) -> int:
+        return max(1, -(-self.music_state.queue_length() // self.page_size))
+
+    async def render(self, page: int) -> discord.Embed:
+        if self._version != self.music_state.version:
+            self._version = self.music_state.version
+            self._pages.clear()
+        page_count = self.page_count()
+        page = min(max(page, 0), page_count - 1)
+        embed = self._pages.get(page)
+        if embed is not None:
+            self.hits += 1
+            return embed
+
+        self.misses += 1
+        start = page * self.page_size
+        tracks = self.music_state.get_queue_slice(start, start + self.page_size)
+        embed = await MusicEmbed.create_queue(tracks, start, page, page_count, self.music_state.queue_length())
+        self._pages[page] = embed
+        return embed
+
+
+class MusicQueueView(discord.ui.View):
+    def __init__(self, queue_pages: QueuePages, page: int = 0):
+        super().__init__(timeout=MusicConfig.QUEUE_VIEW_TIMEOUT)
+        self.queue_pages = queue_pages
+        self.page = page
+        self._update_buttons()
+
+    def _update_buttons(self):
+        page_count = self.queue_pages.page_count()
+        self.page = min(self.page, page_count - 1)
+        self.previous_page_button.disabled = self.page <= 0
+        self.next_page_button.disabled = self.page >= page_count - 1
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        self._update_buttons()
+        embed = await self.queue_pages.render(self.page)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀️ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶️", style=discord.ButtonStyle.secondary)
+    async def next_page_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
 class MusicEmbed:
     """Class to handle music embed creation and formatting"""
     @staticmethod
@@ -70,17 +132,20 @@ class MusicEmbed:
         return embed
     
     @staticmethod
-    async def create_queue(queue: list[RequestInfo]) -> discord.Embed:
+    async def create_queue(queue: list[RequestInfo], start: int = 0, page: int = 0, page_count: int = 1, total: Optional[int] = None) -> discord.Embed:
+        """Render one page of the queue, start is the queue index of its first track"""
         embed = discord.Embed(
             title="🎵 Danh sách hàng đợi",
             color=discord.Color.pink()
         )
+        if page_count > 1:
+            embed.description = f"Page {page + 1}/{page_count} · {total if total is not None else len(queue)} tracks"
         
-        for i, request_info in enumerate(queue):
+        for i, request_info in enumerate(queue, start):
             music_info = request_info.music_info
             embed.add_field(
-                name=f"{i + 1}. {music_info.title}",
-                value=f"👤 {request_info.requester.display_name}",
+                name=f"{i + 1}. {music_info.title}"[:256],
+                value=f"👤 {request_info.requester_name}",
                 inline=False
             )
 
@@ -90,8 +155,8 @@ class MusicEmbed:
     @staticmethod
     async def _add_requester(embed: discord.Embed, request_info: RequestInfo):
         embed.set_author(
-            name=f"Requested by {request_info.requester.display_name}",
-            icon_url=request_info.requester.display_avatar.url
+            name=f"Requested by {request_info.requester_name}",
+            icon_url=request_info.requester_avatar or None
         )
 
     @staticmethod
@@ -133,7 +198,7 @@ class UIHelper:
     """Helper class for UI-related utilities"""
     @staticmethod
     def generate_process_bar(duration: int, time_played: int) -> str:
-        progress = time_played / duration
+        progress = min(time_played / duration, 1) if duration else 0
         bar_length = ProcessBar.BAR_LENGTH.value
         progress_position = int(progress * bar_length)
         
@@ -151,4 +216,14 @@ class UIHelper:
     @staticmethod
     def convert_seconds_to_time(seconds: int) -> str:
         minutes, seconds = divmod(seconds, 60)
-        return f"{minutes}:{seconds:02d}"
\ No newline at end of file
+        return f"{minutes}:{seconds:02d}"
+
+    @staticmethod
+    def parse_time(text: str) -> Optional[int]:
+        """Seconds from "90", "1:30" or "1:02:03", None when the text is not a time"""
+        seconds = 0
+        for part in text.strip().split(':'):
+            if not part.isdigit():
+                return None
+            seconds = seconds * 60 + int(part)
+        return seconds
\ No newline at end of file
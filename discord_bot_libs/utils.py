@@ -1,38 +1,32 @@
-import asyncio
+import random
 import time
 import discord
-from fastapi import Request
 from loguru import logger
-import yt_dlp
-from discord_bot_api.model.music_model import MusicInfo, map_music_info
+from discord_bot_api.model.music_model import MusicInfo
+from discord_bot_libs.constants import ApiConfig
+from discord_bot_libs.metrics import metrics
+from discord_bot_libs.resolver import resolver
+from discord_bot_libs.ui.message_expiry import expiry_scheduler
 
 
-async def get_music_info(query) -> MusicInfo:
-    ydl_opts = {'format': 'bestaudio/best', 'noplaylist': True, 'quiet': True, 'default_search': 'ytsearch'}
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(query, download=False)
-            if 'entries' in info:
-                info = info['entries'][0]
-            music_info = map_music_info(info)
-            return music_info
-    except Exception as e:
-        logger.error(f"Failed to get music info: {e}")
-        return None
+HTTP_REQUEST_SECONDS = metrics.histogram('discord_bot_http_request_seconds', 'Time to serve one API request')
+
+
+async def get_music_info(query, timeout: float = None) -> MusicInfo:
+    return await resolver.resolve(query, timeout)
     
 
 async def send_temp_message(interaction: discord.Interaction, content: str, delete_after: float = 5.0):
-    """Send a temporary message that will be deleted after specified seconds"""
-    message = await interaction.followup.send(content=content, wait=True, ephemeral=False)
-    await asyncio.sleep(delete_after)
+    """Send a temporary message, returns once it is sent and the expiry scheduler deletes it later"""
     try:
-        await message.delete()
-    except discord.NotFound:
-        pass  # Message already deleted
+        message = await interaction.followup.send(content=content, wait=True, ephemeral=False)
+        expiry_scheduler.schedule(message, delete_after)
+    except Exception as e:
+        logger.error(f"Error sending temporary message: {e}")
 
 
 async def send_temp_noti(interaction: discord.Interaction, title: str = '', description: str = '', url: str = '', delete_after: float = 7.0, color: discord.Color = discord.Color.pink()):
-    """Send a temporary embed message that will be deleted after specified seconds"""
+    """Send a temporary embed message, returns once it is sent and the expiry scheduler deletes it later"""
     embed = discord.Embed(
         title=title,
         description=description,
@@ -43,25 +37,41 @@ async def send_temp_noti(interaction: discord.Interaction, title: str = '', desc
     await send_temp_embed(interaction, embed, delete_after)
 
 
-async def send_temp_embed(interaction: discord.Interaction, embed: discord.Embed, delete_after: float = 15):
-    """Send a temporary embed message that will be deleted after specified seconds"""
+async def send_temp_embed(interaction: discord.Interaction, embed: discord.Embed, delete_after: float = 15, view: discord.ui.View = discord.utils.MISSING):
+    """Send a temporary embed message, returns once it is sent and the expiry scheduler deletes it later"""
     try:
-        message = await interaction.followup.send(embed=embed, wait=True, ephemeral=False)
-        await asyncio.sleep(delete_after)
-        await message.delete()
-    except discord.NotFound:
-        pass  # Message already deleted
+        message = await interaction.followup.send(embed=embed, view=view, wait=True, ephemeral=False)
+        expiry_scheduler.schedule(message, delete_after)
     except Exception as e:
         logger.error(f"Error sending temporary embed: {e}")
 
 
-async def log_request_time_async(request: Request, call_next):
-	start_time = time.time()
-	response = await call_next(request)
-	end_time = time.time()
+class RequestTimingMiddleware:
+    """Pure ASGI request timing, logs slow and failed requests and a sample of the rest"""
+    def __init__(self, app, sample_rate: float = ApiConfig.LOG_SAMPLE_RATE, slow_seconds: float = ApiConfig.SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-	elapsed_time = (end_time - start_time) * 1000  # Convert to milliseconds
+        start_time = time.perf_counter()
+        status = 500
 
-	logger.info(f"{request.method} {request.url.path} - elapsed: {elapsed_time:.2f} ms | headers: {request.headers}")
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
 
-	return response
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            HTTP_REQUEST_SECONDS.observe(elapsed)
+            if status >= 500 or elapsed >= self.slow_seconds or random.random() < self.sample_rate:
+                # Arguments are only formatted when the record is emitted
+                logger.info("{} {} {} - elapsed: {:.2f} ms", scope['method'], scope['path'], status, elapsed * 1000)
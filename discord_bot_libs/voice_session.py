@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import discord
+from loguru import logger
+
+from discord_bot_libs.constants import VoiceConfig
+from discord_bot_libs.metrics import metrics
+
+
+CONNECT_SECONDS = metrics.histogram('discord_bot_voice_connect_seconds', 'Time to join a voice channel, retries included')
+MOVE_SECONDS = metrics.histogram('discord_bot_voice_move_seconds', 'Time to move a connected voice client to another channel')
+VOICE_EVENTS = metrics.counter('discord_bot_voice_events_total', 'Voice connection lifecycle events', ('event',))
+
+
+class VoiceSession:
+    """The voice connection of one guild, kept warm while tracks are queued
+
+    connect joins or moves to a channel under a lock, so commands racing on a cold guild
+    share one handshake. A failed handshake is retried with exponential backoff. Once the
+    queue runs out, idle schedules a disconnect after IDLE_TIMEOUT that any later connect
+    cancels, releasing the WebSocket, the UDP socket and the Opus encoder of quiet guilds.
+
+    discord.py resumes transient drops itself without ending playback, so a voice client
+    that stopped being connected was either disconnected on Discord's side, by a moderator
+    or a deleted channel, or gave up reconnecting. Only the latter is rejoined.
+    """
+    def __init__(self, guild_id: Optional[int] = None, idle_timeout: float = VoiceConfig.IDLE_TIMEOUT):
+        self.guild_id = guild_id
+        self.idle_timeout = idle_timeout
+        self.voice_client: Optional[discord.VoiceClient] = None
+        self.channel: Optional[discord.VoiceChannel] = None  # Last channel joined, reconnect goes back there
+        self._lock = asyncio.Lock()
+        self._idle_task: Optional[asyncio.Task] = None
+        self._generation = 0  # Bumped by every connect, an idle disconnect only applies to its own generation
+
+    def is_connected(self) -> bool:
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    def is_lost(self) -> bool:
+        """Whether the connection dropped without being disconnected here"""
+        return self.voice_client is not None and not self.voice_client.is_connected()
+
+    def is_kicked(self) -> bool:
+        """Whether Discord reports the bot out of the channel, the guild cache is updated before discord.py disconnects"""
+        me = self.voice_client.guild.me
+        return me is None or me.voice is None
+
+    def forget(self):
+        """Drop a voice client that discord.py already disconnected and cleaned up"""
+        self._cancel_idle()
+        if self.voice_client is not None:
+            VOICE_EVENTS.inc(1, 'kicked')
+            logger.info(f"Disconnected from voice in guild {self.guild_id} by Discord, not rejoining")
+            self.voice_client = None
+
+    async def connect(self, channel: discord.VoiceChannel) -> Optional[discord.VoiceClient]:
+        """Join or move to channel, None when every attempt failed"""
+        self._cancel_idle()
+        async with self._lock:
+            try:
+                self.channel = channel
+                if self.is_connected():
+                    if self.voice_client.channel != channel:
+                        await self._move(channel)
+                    return self.voice_client
+                if self.voice_client is not None:
+                    VOICE_EVENTS.inc(1, 'lost')
+                    await self._drop()
+                self.voice_client = await self._connect_with_backoff(channel)
+                return self.voice_client
+            finally:
+                # An idle timer that fired while this connect held the lock is stale
+                self._generation += 1
+
+    async def reconnect(self) -> Optional[discord.VoiceClient]:
+        """Rejoin the last channel after the connection was lost"""
+        if self.channel is None:
+            return None
+        VOICE_EVENTS.inc(1, 'reconnect')
+        logger.warning(f"Voice connection of guild {self.guild_id} lost, reconnecting to {self.channel.name}")
+        return await self.connect(self.channel)
+
+    async def _move(self, channel: discord.VoiceChannel):
+        start_time = time.perf_counter()
+        await self.voice_client.move_to(channel)
+        MOVE_SECONDS.observe(time.perf_counter() - start_time)
+        VOICE_EVENTS.inc(1, 'move')
+
+    async def _connect_with_backoff(self, channel: discord.VoiceChannel) -> Optional[discord.VoiceClient]:
+        start_time = time.perf_counter()
+        delay = VoiceConfig.RETRY_DELAY
+        for attempt in range(1, VoiceConfig.CONNECT_ATTEMPTS + 1):
+            try:
+                voice_client = await channel.connect(timeout=VoiceConfig.CONNECT_TIMEOUT, reconnect=True)
+            except (asyncio.TimeoutError, discord.ClientException, discord.ConnectionClosed, OSError) as e:
+                logger.warning(f"Voice connect to {channel.name} failed (attempt {attempt}/{VoiceConfig.CONNECT_ATTEMPTS}): {e}")
+                if attempt == VoiceConfig.CONNECT_ATTEMPTS:
+                    break
+                await asyncio.sleep(random.uniform(delay * 0.5, delay))
+                delay = min(delay * 2, VoiceConfig.MAX_RETRY_DELAY)
+                continue
+            elapsed = time.perf_counter() - start_time
+            CONNECT_SECONDS.observe(elapsed)
+            VOICE_EVENTS.inc(1, 'connect')
+            logger.info(f"Joined {channel.name} in {elapsed * 1000:.0f} ms")
+            return voice_client
+        VOICE_EVENTS.inc(1, 'connect_failed')
+        logger.error(f"Giving up joining {channel.name} after {VoiceConfig.CONNECT_ATTEMPTS} attempts")
+        return None
+
+    def idle(self):
+        """The queue ran out, disconnect unless something plays again within idle_timeout"""
+        self._cancel_idle()
+        if self.voice_client is not None:
+            self._idle_task = asyncio.create_task(self._disconnect_when_idle(self._generation))
+
+    def _cancel_idle(self):
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            self._idle_task = None
+
+    async def _disconnect_when_idle(self, generation: int):
+        # The handle stays set until the lock is taken, so a connect can still cancel this
+        await asyncio.sleep(self.idle_timeout)
+        async with self._lock:
+            if self._idle_task is asyncio.current_task():
+                self._idle_task = None
+            if generation != self._generation or self.voice_client is None:
+                return
+            if self.voice_client.is_playing() or self.voice_client.is_paused():
+                return
+            VOICE_EVENTS.inc(1, 'idle_disconnect')
+            logger.info(f"Leaving voice in guild {self.guild_id} after {self.idle_timeout:.0f}s idle")
+            await self._drop()
+
+    async def _drop(self):
+        voice_client, self.voice_client = self.voice_client, None
+        try:
+            await voice_client.disconnect(force=True)
+        except Exception as e:
+            logger.error(f"Error disconnecting voice client: {e}")
+
+    async def close(self):
+        self._cancel_idle()
+        if self.voice_client is not None:
+            await self._drop()
@@ -1,16 +1,55 @@
+import asyncio
+import importlib
 import traceback
 
+from discord_bot_libs.startup_profile import startup_profile
+startup_profile.install()
+
+import discord
 from config import *
 from discord_bot_api.bot_client import client
-import api
+from discord_bot_libs.constants import ApiConfig
+startup_profile.mark('imports')
+
+
+async def serve_api() -> bool:
+    """FastAPI is imported on a worker thread while the client logs in, it is not needed before
 
+    Returns False when the server could not run, the bot keeps going without it.
+    """
+    try:
+        with startup_profile.phase('import api'):
+            api = await asyncio.to_thread(importlib.import_module, 'api')
+        await api.serve()
+    except Exception as e:
+        logger.error(f"API server stopped, the bot keeps running without it: {e}")
+        return False
+    return True
 
 
+async def main():
+    """Run the Discord client and the API server on one event loop, stop both when either stops"""
+    # client.run installs discord.py's log handler, client.start leaves that to the caller
+    discord.utils.setup_logging(root=False)
+    async with client:
+        bot = asyncio.create_task(client.start(BOT_KEY), name='discord')
+        tasks = [bot]
+        if ApiConfig.ENABLED:
+            tasks.append(asyncio.create_task(serve_api(), name='api'))
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if bot not in done and not any(task.result() for task in done):
+            done, pending = await asyncio.wait([bot])
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
 
 
 if __name__ == "__main__":
-    # api.keep_alive()
     try:
-        client.run(BOT_KEY)
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
-        logger.error(f"Failed to run bot: {e} | Traceback: \n{traceback.format_exc()}")
\ No newline at end of file
+        logger.error(f"Failed to run bot: {e} | Traceback: \n{traceback.format_exc()}")
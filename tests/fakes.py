@@ -0,0 +1,309 @@
+"""Local stand-ins for the Discord and yt-dlp objects the music commands touch
+
+Shared by the tests and the benchmarks, nothing here talks to the network. Latencies are
+configurable and are spent the way the real objects spend them: HTTP calls sleep on the
+event loop, extractions block a resolver worker thread and the voice client reads 20 ms
+frames in real time on its own thread.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+import discord
+
+from discord_bot_api.model.music_model import MusicInfo, map_music_info
+from discord_bot_libs.audio_source import PlaybackSource
+
+
+FRAME_SECONDS = 0.02
+_ids = itertools.count(1)
+
+
+def jitter(latency: float) -> float:
+    return random.uniform(latency * 0.5, latency * 1.5) if latency else 0.0
+
+
+def raw_info(index: int) -> dict:
+    """What yt-dlp returns for a typical music video"""
+    video_id = f'{index:011d}'
+    return {
+        'id': video_id,
+        'title': f'Artist {index % 97} - Some fairly typical song title number {index} (Official Audio)',
+        'url': f'https://rr3---sn-8pxuuxa-i5ozr.googlevideo.com/videoplayback?expire={int(time.time()) + 21600}&ei=' + 'x' * 900,
+        'thumbnail': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+        'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        'duration': 200 + index % 100,
+        'view_count': 1_000_000 + index,
+        'uploader': f'Artist {index % 97}',
+        'uploader_url': f'https://www.youtube.com/@artist{index % 97}',
+        'upload_date': '20240101',
+        'description': 'Lyrics and links. ' * 150,
+        'acodec': 'opus',
+        'abr': 129.5,
+    }
+
+
+class FakeAvatar:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeVoiceState:
+    def __init__(self, channel: 'FakeVoiceChannel'):
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, user_id: int, voice_channel: Optional['FakeVoiceChannel']):
+        self.id = user_id
+        self.display_name = f'user-{user_id}'
+        self.display_avatar = FakeAvatar(f'https://cdn.discordapp.com/avatars/{user_id}/avatar.png')
+        self.voice = FakeVoiceState(voice_channel) if voice_channel else None
+
+
+class FakeGuild:
+    """Holds the bot's own member, whose voice state Discord clears when it kicks the bot"""
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.me = FakeMember(0, None)
+
+
+class FakeTextChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeTextChannel, webhook: 'FakeWebhook'):
+        self.id = next(_ids)
+        self.channel = channel
+        self.webhook = webhook
+
+    async def edit(self, **kwargs):
+        await self.webhook.call('edit')
+        return self
+
+    async def delete(self):
+        await self.webhook.call('delete')
+
+
+class FakeWebhook:
+    """Interaction followup webhook, every call waits one HTTP round trip"""
+    def __init__(self, channel: FakeTextChannel, latency: float):
+        self.channel = channel
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        self.titles: List[str] = []  # Embed titles of the messages sent
+
+    async def call(self, kind: str):
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+        await asyncio.sleep(jitter(self.latency))
+
+    async def send(self, *args, embed: Optional[discord.Embed] = None, **kwargs) -> FakeMessage:
+        if embed is not None:
+            self.titles.append(embed.title)
+        await self.call('send')
+        return FakeMessage(self.channel, self)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.deferred = False
+
+    def is_done(self) -> bool:
+        return self.deferred
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+
+class FakeInteraction(discord.Interaction):
+    """Passes the isinstance checks of the music commands without a gateway state"""
+    user = None
+    guild_id = None
+    channel = None
+    followup = None
+    response = None
+
+    def __init__(self, user: FakeMember, guild_id: int, channel: FakeTextChannel, http_latency: float):
+        self.user = user
+        self.guild_id = guild_id
+        self.channel = channel
+        self.followup = FakeWebhook(channel, http_latency)
+        self.response = FakeResponse()
+
+
+class FakeAudioSource(discord.AudioSource):
+    """The first read blocks for startup seconds, like ffmpeg connecting and buffering"""
+    def __init__(self, seconds: float, startup: float = 0.0):
+        self.frames = max(1, int(seconds / FRAME_SECONDS))
+        self.startup = startup
+
+    def read(self) -> bytes:
+        if self.startup:
+            time.sleep(jitter(self.startup))
+            self.startup = 0.0
+        if self.frames <= 0:
+            return b''
+        self.frames -= 1
+        return b'\xf8\xff\xfe'
+
+    def is_opus(self) -> bool:
+        return True
+
+
+class FakeVoiceClient:
+    """Consumes frames in real time like discord.py's audio player thread
+
+    Records when the first frame of every source was read and how long the channel was
+    silent between two sources, split by whether the previous one ended or was stopped.
+    """
+    def __init__(self, channel: 'FakeVoiceChannel'):
+        self.channel = channel
+        self.guild = channel.guild
+        self.first_frame_at: List[float] = []
+        self.transition_gaps: List[float] = []
+        self.skip_gaps: List[float] = []
+        self._source: Optional[discord.AudioSource] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._silent_since: Optional[tuple[float, bool]] = None
+        self._lock = threading.Lock()
+
+    def play(self, source: discord.AudioSource, *, after: Optional[Callable] = None):
+        if self.is_playing() or self.is_paused():
+            raise discord.ClientException('Already playing audio.')
+        self._stop = threading.Event()
+        self._resumed.set()
+        self._source = source
+        self._thread = threading.Thread(target=self._run, args=(source, after, self._stop), daemon=True)
+        self._thread.start()
+
+    def _run(self, source: discord.AudioSource, after: Optional[Callable], stop: threading.Event):
+        next_frame = time.perf_counter()
+        first = True
+        while not stop.is_set():
+            self._resumed.wait()
+            if stop.is_set():
+                break
+            data = source.read()
+            now = time.perf_counter()
+            if not data:
+                break
+            if first:
+                first = False
+                self.first_frame_at.append(now)
+                with self._lock:
+                    if self._silent_since:
+                        since, stopped = self._silent_since
+                        (self.skip_gaps if stopped else self.transition_gaps).append(now - since)
+                        self._silent_since = None
+            next_frame += FRAME_SECONDS
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+        with self._lock:
+            self._silent_since = (time.perf_counter(), stop.is_set())
+        if self._source is source:
+            self._source = None
+        if after:
+            after(None)
+
+    def is_playing(self) -> bool:
+        return self._source is not None and self._resumed.is_set()
+
+    def is_paused(self) -> bool:
+        return self._source is not None and not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        self._stop.set()
+        self._resumed.set()
+        self._source = None
+
+    def is_connected(self) -> bool:
+        return self.channel.guild_voice.get(self.channel.guild_id) is self
+
+    def join(self, timeout: float = 1.0):
+        if self._thread:
+            self._thread.join(timeout)
+
+    async def move_to(self, channel: 'FakeVoiceChannel'):
+        self.channel = channel
+
+    async def disconnect(self, **kwargs):
+        self.guild.me.voice = None
+        self.stop()
+        self.channel.guild_voice.pop(self.channel.guild_id, None)
+
+    def drop(self):
+        """The connection gave up reconnecting, the bot is still in the channel as far as Discord knows"""
+        self.channel.guild_voice.pop(self.channel.guild_id, None)
+        self._stop.set()
+        self._resumed.set()
+
+    def kick(self):
+        """A moderator disconnected the bot, Discord updates the member before the connection closes"""
+        self.guild.me.voice = None
+        self.drop()
+
+
+class FakeVoiceChannel:
+    """A voice channel whose connect() takes a voice handshake worth of time"""
+    def __init__(self, guild_id: int, connect_latency: float, guild_voice: dict):
+        self.id = next(_ids)
+        self.guild = FakeGuild(guild_id)
+        self.guild_id = guild_id
+        self.name = f'voice-{guild_id}'
+        self.connect_latency = connect_latency
+        self.guild_voice = guild_voice
+        self.voice_clients: List[FakeVoiceClient] = []  # Every connection made, to join their audio threads
+
+    async def connect(self, **kwargs) -> FakeVoiceClient:
+        if self.guild_id in self.guild_voice:
+            raise discord.ClientException('Already connected to a voice channel.')
+        voice_client = FakeVoiceClient(self)
+        self.voice_clients.append(voice_client)
+        self.guild_voice[self.guild_id] = voice_client
+        self.guild.me.voice = FakeVoiceState(self)
+        await asyncio.sleep(jitter(self.connect_latency))
+        return voice_client
+
+
+class FakeExtractor:
+    """Replaces the yt-dlp call of the resolver, blocks the worker thread like an extraction"""
+    def __init__(self, latency: float, track_seconds: float):
+        self.latency = latency
+        self.track_seconds = track_seconds
+        self.calls = 0
+        self._index = itertools.count()
+        self._extracted: dict[str, tuple[int, str]] = {}  # webpage_url -> index and title, URLs resolve to the same video
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str) -> MusicInfo:
+        with self._lock:
+            self.calls += 1
+            known = self._extracted.get(query)
+            if known:
+                index, title = known
+            else:
+                index = next(self._index)
+                title = f'{query} ({index})'
+                self._extracted[raw_info(index)['webpage_url']] = (index, title)
+        time.sleep(jitter(self.latency))
+        info = raw_info(index)
+        info['title'] = title
+        info['duration'] = max(1, round(self.track_seconds))
+        return map_music_info(info)
+
+
+async def fake_audio_source(track_seconds: float, music_info: MusicInfo, *args, start: float = 0.0, startup: float = 0.0, **kwargs) -> PlaybackSource:
+    return PlaybackSource(FakeAudioSource(track_seconds - start, startup), time.perf_counter(), start, track_seconds)
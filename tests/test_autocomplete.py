@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from discord_bot_api.model.music_model import map_playlist_entry
+from discord_bot_libs.autocomplete import QueryAutocomplete
+from discord_bot_libs.music_cache import music_cache
+from discord_bot_libs.resolver import resolver
+
+
+SEARCH_SECONDS = 0.2
+
+
+@pytest.fixture
+def autocomplete(monkeypatch) -> QueryAutocomplete:
+    """Searches answer after SEARCH_SECONDS with one hit named after the query"""
+    def search(query: str, count: int) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        hit = map_playlist_entry({'url': f'https://www.youtube.com/watch?v={query[:11]}', 'id': query[:11], 'title': query})
+        loop.call_later(SEARCH_SECONDS, future.set_result, [hit])
+        return future
+    monkeypatch.setattr(resolver, 'search', search)
+    monkeypatch.setattr(music_cache, 'recent_titles', lambda limit: [])
+    return QueryAutocomplete()
+
+
+def test_repeated_keystroke_waits_for_the_search_in_flight(autocomplete):
+    async def run():
+        first = asyncio.create_task(autocomplete.suggest(1, 'lofi beats'))
+        await asyncio.sleep(0.05)
+        repeat = await autocomplete.suggest(1, 'lofi beats')
+        assert [choice.name for choice in repeat] == [choice.name for choice in await first] == ['lofi beats']
+        assert autocomplete.searches == 1
+    asyncio.run(run())
+
+
+def test_newer_keystroke_takes_over(autocomplete):
+    async def run():
+        first = asyncio.create_task(autocomplete.suggest(1, 'lofi'))
+        await asyncio.sleep(0.05)
+        latest = await autocomplete.suggest(1, 'lofi beats')
+        assert await first == []
+        assert [choice.name for choice in latest] == ['lofi beats']
+        assert autocomplete.searches == 1
+    asyncio.run(run())
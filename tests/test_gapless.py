@@ -0,0 +1,111 @@
+import discord
+import pytest
+
+from discord_bot_libs.audio_source import PlaybackSource
+from discord_bot_libs.gapless import GaplessSource
+
+FRAME = 3840  # 20 ms of 16-bit stereo PCM
+
+
+class Frames(discord.AudioSource):
+    def __init__(self, count: int, fill: bytes = b'\x01', opus: bool = True, frame_size: int = 3):
+        self.count = count
+        self.frame = fill * frame_size
+        self.opus = opus
+        self.cleaned = False
+
+    def read(self) -> bytes:
+        if not self.count:
+            return b''
+        self.count -= 1
+        return self.frame
+
+    def is_opus(self) -> bool:
+        return self.opus
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+class Loop:
+    """Runs what the audio thread hands to the event loop right away"""
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+def playback(frames: Frames, seconds: float) -> PlaybackSource:
+    return PlaybackSource(frames, None, 0.0, seconds)
+
+
+def chain(first: PlaybackSource, **kwargs):
+    near_end, transitions = [], []
+    source = GaplessSource(first, Loop(), near_end.append, transitions.append, prespawn=0.1, **kwargs)
+    return source, near_end, transitions
+
+
+def read_all(source: GaplessSource) -> list:
+    frames = []
+    while data := source.read():
+        frames.append(data)
+    return frames
+
+
+def test_read_crosses_into_the_next_track_without_an_empty_frame():
+    first, second = Frames(10, b'\x01'), Frames(10, b'\x02')
+    source, near_end, transitions = chain(playback(first, 0.2))
+    for _ in range(5):
+        source.read()
+    assert near_end == [source]
+    assert source.set_next(playback(second, 0.2), 'next track', lambda: True)
+
+    frames = read_all(source)
+    assert frames == [first.frame] * 5 + [second.frame] * 10
+    assert transitions == ['next track']
+    assert first.cleaned
+    assert source.gap_since is not None  # The first frame of the next track measured its gap
+
+
+def test_next_track_is_dropped_when_the_queue_changed():
+    first, second = Frames(3), Frames(3, b'\x02')
+    source, _, transitions = chain(playback(first, 0.06))
+    assert source.set_next(playback(second, 0.06), 'stale track', lambda: False)
+
+    assert read_all(source) == [first.frame] * 3
+    assert transitions == []
+    assert second.cleaned
+
+
+def test_set_next_refuses_another_kind_of_source_and_a_closed_chain():
+    source, _, _ = chain(playback(Frames(3), 0.06))
+    assert not source.set_next(playback(Frames(3, opus=False), 0.06), 'pcm track', lambda: True)
+    source.cleanup()
+    assert not source.set_next(playback(Frames(3), 0.06), 'late track', lambda: True)
+    assert not source.needs_next(source.current)
+
+
+def test_cleanup_releases_the_prepared_track():
+    second = Frames(3)
+    source, _, _ = chain(playback(Frames(3), 0.06))
+    source.set_next(playback(second, 0.06), 'next track', lambda: True)
+    source.cleanup()
+    assert second.cleaned
+
+
+def test_crossfade_mixes_the_outgoing_track_into_the_next():
+    np = pytest.importorskip('numpy')
+    first = Frames(10, b'\x00\x10', opus=False, frame_size=FRAME // 2)
+    second = Frames(10, b'\x00\x20', opus=False, frame_size=FRAME // 2)
+    source, _, transitions = chain(playback(first, 0.2), crossfade=0.06)
+    assert source.crossfade_frames == 3
+    source.set_next(playback(second, 0.2), 'next track', lambda: True)
+
+    frames = [np.frombuffer(frame, dtype='<i2') for frame in read_all(source)]
+    assert transitions == ['next track']
+    # Ten outgoing frames overlap the first three incoming ones
+    assert len(frames) == 10 + 10 - 3
+    assert all((frame == 0x1000).all() for frame in frames[:7])
+    fade = frames[7:10]
+    assert fade[0][0] == 0x1000  # Equal-power gains start at the outgoing track alone
+    assert abs(int(fade[-1][-1]) - 0x2000) < 16  # and end at the incoming one alone
+    assert all((frame == 0x2000).all() for frame in frames[10:])
+    assert first.cleaned
@@ -0,0 +1,29 @@
+import threading
+
+from discord_bot_api.model.music_model import map_music_info
+from discord_bot_libs.music_cache import MusicInfoCache
+from tests.fakes import raw_info
+
+
+def test_lookup_falls_back_to_disk(tmp_path):
+    cache = MusicInfoCache(str(tmp_path / 'music.sqlite3'))
+    music_info = map_music_info(raw_info(1))
+    cache.put('some song', music_info)
+    cache.clear_memory()
+
+    cached, playable = cache.lookup('some song')
+    assert cached.video_id == music_info.video_id and playable
+    assert cache.stats.disk_hits == 1
+    assert cache.get_fresh('some song').video_id == music_info.video_id
+
+
+def test_memory_lookup_does_not_wait_on_sqlite(tmp_path):
+    cache = MusicInfoCache(str(tmp_path / 'music.sqlite3'))
+    cache.put('some song', map_music_info(raw_info(1)))
+    found = []
+    with cache._db_lock:  # A worker thread in the middle of a commit or a prune
+        reader = threading.Thread(target=lambda: found.append(cache.get_fresh('some song')))
+        reader.start()
+        reader.join(timeout=1)
+        assert not reader.is_alive()
+    assert found[0] is not None
@@ -0,0 +1,26 @@
+from discord_bot_api.model.music_model import MusicInfo, map_music_info, map_playlist_entry
+from tests.fakes import raw_info
+
+
+def test_trusted_music_info_matches_validated():
+    music_info = map_music_info(raw_info(1))
+    validated = MusicInfo(**music_info.model_dump())
+    assert music_info == validated
+    assert music_info.model_dump() == validated.model_dump()
+    assert MusicInfo.model_validate_json(music_info.model_dump_json()) == music_info
+    assert music_info.model_copy(update={'url': ''}).url == ''
+
+
+def test_trusted_music_info_fills_defaults():
+    music_info = map_playlist_entry({'url': 'https://www.youtube.com/watch?v=abcdefghijk', 'id': 'abcdefghijk', 'title': 'Song'})
+    assert music_info.model_dump() == MusicInfo(
+        title='Song', url='', thumbnail='', webpage_url='https://www.youtube.com/watch?v=abcdefghijk', duration=0,
+        video_id='abcdefghijk', view_count=0, channel='Unknown',
+    ).model_dump()
+
+
+def test_compact_drops_stream_url_and_description():
+    music_info = map_music_info(raw_info(2))
+    compact = music_info.compact()
+    assert compact.url == '' and compact.description == ''
+    assert compact.model_dump(exclude={'url', 'description'}) == music_info.model_dump(exclude={'url', 'description'})
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import time
+
+import discord
+import pytest
+
+from discord_bot_libs.audio_source import FRAME_SECONDS, PlaybackSource
+from discord_bot_libs.loudness import TrackAnalysis, loudness_index
+from discord_bot_libs.manager import music_manager
+from discord_bot_libs.manager.music_manager import MusicPlayer
+from discord_bot_libs.resolver import resolver
+from discord_bot_libs.ui.message_expiry import expiry_scheduler
+from discord_bot_libs.ui.music_ui import UIHelper
+from tests.fakes import FakeExtractor, FakeInteraction, FakeMember, FakeTextChannel, FakeVoiceChannel, fake_audio_source
+
+
+TRACK_SECONDS = 200
+
+
+@pytest.fixture
+def channel(monkeypatch) -> FakeVoiceChannel:
+    """A voice channel to play in, tracks resolve instantly and their frames are read in real time"""
+    monkeypatch.setattr(resolver, 'cache', None)
+    monkeypatch.setattr(resolver, '_extract', FakeExtractor(0.0, TRACK_SECONDS))
+    monkeypatch.setattr(music_manager, 'create_audio_source', functools.partial(fake_audio_source, TRACK_SECONDS))
+    monkeypatch.setattr(expiry_scheduler, 'schedule', lambda message, delete_after: None)  # Nothing outlives the test's loop
+    return FakeVoiceChannel(1, 0.0, {})
+
+
+def interaction(channel: FakeVoiceChannel) -> FakeInteraction:
+    return FakeInteraction(FakeMember(1, channel), channel.guild_id, FakeTextChannel(1), 0.0)
+
+
+class Frames(discord.AudioSource):
+    def __init__(self, count: int):
+        self.count = count
+
+    def read(self) -> bytes:
+        if not self.count:
+            return b''
+        self.count -= 1
+        return b'\x00'
+
+
+@pytest.mark.parametrize('text, seconds', [
+    ('90', 90), ('1:30', 90), ('1:02:03', 3723), (' 0:05 ', 5), ('', None), ('1:', None), ('-5', None), ('1m', None),
+])
+def test_parse_time(text, seconds):
+    assert UIHelper.parse_time(text) == seconds
+
+
+def test_position_counts_frames_from_the_offset():
+    source = PlaybackSource(Frames(50), None, offset=30.0, end=32.0)
+    for _ in range(50):
+        assert source.read()
+    assert source.position == pytest.approx(30.0 + 50 * FRAME_SECONDS)
+    assert source.remaining() == pytest.approx(1.0)
+    assert source.read() == b''
+    assert source.ended_at is not None
+    assert source.position == pytest.approx(31.0)
+
+
+def current(player: MusicPlayer):
+    return player.music_state.current_track.music_info.title if player.music_state.current_track else None
+
+
+def playing(player: MusicPlayer, title: str) -> bool:
+    """The track is current and its source reached the voice client"""
+    return current(player) == title and player.audio_player is not None and player.audio_player.is_playing()
+
+
+def titles(player: MusicPlayer):
+    return [request.music_info.title for request in player.music_state.get_queue()]
+
+
+def run_player(channel: FakeVoiceChannel, scenario):
+    """Run scenario(player, user) on a fresh player, closed even when an assertion fails"""
+    async def run():
+        player = MusicPlayer(channel.guild_id)
+        try:
+            await scenario(player, interaction(channel))
+        finally:
+            await player.close()
+            for voice_client in channel.voice_clients:
+                await asyncio.to_thread(voice_client.join)
+            await asyncio.sleep(0)  # Their after= callbacks
+    asyncio.run(run())
+
+
+async def until(condition, timeout: float = 2.0):
+    """Wait for the voice client's after= callback and the commands it runs"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        await asyncio.sleep(FRAME_SECONDS)
+
+
+def test_previous_goes_back_one_track_then_replays_the_current_one(channel):
+    async def scenario(player: MusicPlayer, user: FakeInteraction):
+        for query in ('Song 1', 'Song 2', 'Song 3'):
+            await player.play(user, query)
+        await player.skip(user)
+        await until(lambda: playing(player, 'Song 2 (1)'))
+
+        await player.previous(user)
+        await until(lambda: playing(player, 'Song 1 (0)'))
+        assert titles(player) == ['Song 2 (1)', 'Song 3 (2)']
+    run_player(channel, scenario)
+
+
+def test_previous_restarts_a_track_played_past_the_threshold(channel):
+    async def scenario(player: MusicPlayer, user: FakeInteraction):
+        await player.play(user, 'Song 1')
+        await player.seek(user, '0:45')
+        assert player.audio_player.time_played == 45
+
+        await player.previous(user)
+        assert player.audio_player.time_played == 0
+        assert current(player) == 'Song 1 (0)' and titles(player) == []
+    run_player(channel, scenario)
+
+
+def test_seek_rejects_positions_past_the_trimmed_end(channel, monkeypatch):
+    monkeypatch.setattr(loudness_index, 'get', lambda music_info: TrackAnalysis(-14.0, -1.0, 0.0, 0.0, 150.0))
+
+    async def scenario(player: MusicPlayer, user: FakeInteraction):
+        await player.play(user, 'Song 1')
+        await player.seek(user, '2:40')
+        assert "❌ Invalid position!" in user.followup.titles
+        assert player.audio_player.time_played == 0
+
+        await player.seek(user, '2:00')
+        assert "⏩ 2:00" in user.followup.titles
+        assert player.audio_player.time_played == 120
+    run_player(channel, scenario)
+
+
+def test_lost_connection_rejoins_where_the_track_stopped(channel):
+    async def scenario(player: MusicPlayer, user: FakeInteraction):
+        await player.play(user, 'Song 1')
+        await player.seek(user, '1:00')
+        lost = player.voice_client
+        lost.drop()
+        await until(lambda: player.voice_client is not lost and player.audio_player.is_playing())
+        assert player.voice_client.is_connected()
+        assert current(player) == 'Song 1 (0)' and player.audio_player.time_played >= 60
+    run_player(channel, scenario)
+
+
+def test_kicked_bot_stops_instead_of_rejoining(channel):
+    async def scenario(player: MusicPlayer, user: FakeInteraction):
+        await player.play(user, 'Song 1')
+        await player.play(user, 'Song 2')
+        player.voice_client.kick()
+        await until(lambda: player.voice_client is None)
+        assert channel.guild_voice == {} and channel.guild.me.voice is None
+        assert player.audio_player is None and not player.music_state.is_playing
+        assert current(player) is None and titles(player) == ['Song 2 (1)']
+        assert "👋 Disconnected from the voice channel" in user.followup.titles
+    run_player(channel, scenario)
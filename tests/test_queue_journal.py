@@ -0,0 +1,93 @@
+from discord_bot_api.model.music_model import MusicState, record_to_request
+from discord_bot_libs.queue_journal import QueueJournal, replay
+
+
+def track(index: int):
+    return record_to_request({
+        'id': f'video{index:06d}',
+        'title': f'Song {index}',
+        'webpage_url': f'https://www.youtube.com/watch?v=video{index:06d}',
+        'thumbnail': '',
+        'duration': 200,
+        'channel': 'Channel',
+        'view_count': 0,
+        'requester': 1,
+        'time': 0.0,
+    })
+
+
+def journaled_state(tmp_path) -> MusicState:
+    state = MusicState()
+    state.attach_journal(QueueJournal(1, str(tmp_path)))
+    return state
+
+
+def restored_state(tmp_path) -> MusicState:
+    state = MusicState()
+    state.restore(QueueJournal(1, str(tmp_path)).load())
+    return state
+
+
+def test_interrupted_track_resumes_at_its_position(tmp_path):
+    state = journaled_state(tmp_path)
+    state.add_track(track(1))
+    state.add_track(track(2))
+    state.next_track()
+    state.record_position(195)
+    state.detach_journal()
+
+    restored = restored_state(tmp_path)
+    assert [request.music_info.title for request in restored.get_queue()] == ['Song 1', 'Song 2']
+    assert restored.take_resume_position(restored.get_queue()[0]) == 195
+
+
+def test_queue_ran_dry_then_restore(tmp_path):
+    state = journaled_state(tmp_path)
+    state.add_track(track(1))
+    state.next_track()
+    state.record_position(195)
+    assert state.next_track() is None
+    assert state.current_track is None
+    state.detach_journal()
+
+    restored = restored_state(tmp_path)
+    assert restored.get_queue() == []
+    assert restored.resume_position == 0
+    assert [request.music_info.title for request in restored.get_history()] == ['Song 1']
+
+
+def test_queue_ran_dry_in_snapshot(tmp_path):
+    state = journaled_state(tmp_path)
+    state.add_track(track(1))
+    state.next_track()
+    state.next_track()
+    state.shuffle_queue()  # Writes a snapshot instead of journaling an operation
+    state.detach_journal()
+
+    assert QueueJournal(1, str(tmp_path)).load()['current'] is None
+    assert restored_state(tmp_path).get_queue() == []
+
+
+def test_replay_stop_clears_current():
+    record = {'id': 'a', 'title': 'A'}
+    state = replay({'queue': [record]}, [
+        {'op': 'next', 'n': 1},
+        {'op': 'position', 't': 30, 'n': 2},
+        {'op': 'stop', 'n': 3},
+    ])
+    assert state['current'] is None
+    assert state['position'] == 0
+
+
+def test_gapless_hand_over_after_the_queue_changed(tmp_path):
+    state = journaled_state(tmp_path)
+    state.add_track(track(1))
+    state.add_track(track(2))
+    upcoming = state.get_queue()[0]
+    state.remove_track(0)  # The head changed after the audio thread had handed over
+    state.advance_to(upcoming)
+    state.detach_journal()
+
+    restored = restored_state(tmp_path)
+    assert [request.music_info.title for request in restored.get_queue()] == ['Song 1', 'Song 2']
+    assert [request.music_info.title for request in restored.get_history()] == []
@@ -0,0 +1,121 @@
+import asyncio
+
+from discord_bot_libs.voice_session import VoiceSession
+
+
+class Member:
+    def __init__(self):
+        self.voice = object()
+
+
+class Guild:
+    def __init__(self):
+        self.me = Member()
+        self.voice_client = None
+
+
+class VoiceClient:
+    def __init__(self, channel: 'Channel', move_seconds: float):
+        self.channel = channel
+        self.guild = channel.guild
+        self.move_seconds = move_seconds
+        self.connected = True
+        self.disconnects = 0
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def is_playing(self) -> bool:
+        return False
+
+    def is_paused(self) -> bool:
+        return False
+
+    async def move_to(self, channel: 'Channel'):
+        await asyncio.sleep(self.move_seconds)
+        self.channel = channel
+
+    async def disconnect(self, **kwargs):
+        self.connected = False
+        self.disconnects += 1
+        self.guild.voice_client = None
+
+
+class Channel:
+    name = 'voice'
+
+    def __init__(self, guild: Guild, connect_seconds: float = 0.01, move_seconds: float = 0.0):
+        self.guild = guild
+        self.connect_seconds = connect_seconds
+        self.move_seconds = move_seconds
+        self.connects = 0
+
+    async def connect(self, **kwargs) -> VoiceClient:
+        if self.guild.voice_client is not None:
+            raise RuntimeError('Already connected to a voice channel.')
+        self.connects += 1
+        self.guild.voice_client = VoiceClient(self, self.move_seconds)
+        await asyncio.sleep(self.connect_seconds)
+        return self.guild.voice_client
+
+
+def test_concurrent_connects_share_one_handshake():
+    async def run():
+        channel = Channel(Guild())
+        session = VoiceSession(1)
+        clients = await asyncio.gather(*(session.connect(channel) for _ in range(5)))
+        assert channel.connects == 1
+        assert all(client is clients[0] for client in clients)
+    asyncio.run(run())
+
+
+def test_idle_session_disconnects_and_connect_cancels_it():
+    async def run():
+        channel = Channel(Guild())
+        session = VoiceSession(1, idle_timeout=0.05)
+        client = await session.connect(channel)
+        session.idle()
+        await session.connect(channel)
+        await asyncio.sleep(0.1)
+        assert session.voice_client is client and client.disconnects == 0
+
+        session.idle()
+        await asyncio.sleep(0.1)
+        assert session.voice_client is None and client.disconnects == 1
+    asyncio.run(run())
+
+
+def test_idle_timer_firing_during_a_connect_is_stale():
+    async def run():
+        guild = Guild()
+        first, second = Channel(guild, move_seconds=0.1), Channel(guild)
+        session = VoiceSession(1, idle_timeout=0.02)
+        client = await session.connect(first)
+        moving = asyncio.create_task(session.connect(second))
+        await asyncio.sleep(0)
+        session.idle()  # The queue ran dry while the move holds the lock
+        await moving
+        await asyncio.sleep(0.05)
+        assert session.voice_client is client and client.channel is second
+        assert client.disconnects == 0
+    asyncio.run(run())
+
+
+def test_lost_and_kicked_connections():
+    async def run():
+        guild = Guild()
+        channel = Channel(guild)
+        session = VoiceSession(1)
+        client = await session.connect(channel)
+        client.connected = False
+        guild.voice_client = None
+        assert session.is_lost() and not session.is_kicked()
+        assert await session.reconnect() is not client
+        assert session.is_connected()
+
+        session.voice_client.connected = False
+        guild.me.voice = None  # A moderator disconnected the bot
+        assert session.is_lost() and session.is_kicked()
+        session.forget()
+        assert session.voice_client is None and not session.is_lost()
+    asyncio.run(run())